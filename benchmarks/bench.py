@@ -0,0 +1,161 @@
+"""
+Times reading, meshing and exporting synthetic models.
+
+    python benchmarks/bench.py --sizes 16,32 --output results.json
+    python benchmarks/bench.py --sizes 16,32 --compare results.json
+
+Each stage is timed on its own, best of --repeat runs, and run once more
+under tracemalloc for its peak memory. With --compare the run fails if any
+stage is slower than the saved one by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from blockmodel import BlockModel
+from blockmodel.constants import MODES
+
+from volumes import SHAPES, make_volume, to_json, to_sparse_json, to_png, to_schematic
+
+timer = getattr(time, "perf_counter", time.time)
+
+EXPORTERS = (
+    ("obj", "_as_obj", True),
+    ("x3d", "_as_x3d_triangles", True),
+    ("collada", "_as_collada", True),
+    ("glb", "_as_glb", True),
+    ("ply", "_as_ply", True),
+    ("3mf", "_as_3mf", True),
+    ("csv", "_as_csv", False),
+    ("schematic", "_as_schematic", False),
+)
+
+
+def measure(run, setup, repeat, memory):
+    best = None
+    for _ in range(repeat):
+        arg = setup()
+        start = timer()
+        run(arg)
+        elapsed = timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    peak = None
+    if memory and tracemalloc is not None:
+        arg = setup()
+        tracemalloc.start()
+        run(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best, peak
+
+
+def get_stages(shape, size, mode, directory):
+    blocks = make_volume(shape, size)
+    as_json = to_json(blocks, size)
+    as_sparse_json = to_sparse_json(blocks)
+    as_png = to_png(blocks, size)
+    schematic_path = os.path.join(directory, "%s_%s.schematic" % (shape, size))
+    to_schematic(blocks, size, schematic_path)
+
+    def fresh():
+        return BlockModel.from_schematic_file(schematic_path, mode=mode)
+
+    def meshed():
+        model = fresh()
+        model._ensure_mesh()
+        return model
+
+    stages = [
+        ("from_json", lambda _: BlockModel.from_json(as_json, mode=mode), lambda: None),
+        ("from_sparse_json", lambda _: BlockModel.from_sparse_json(as_sparse_json, mode=mode), lambda: None),
+        ("from_png", lambda _: BlockModel.from_png(as_png, mode=mode), lambda: None),
+        ("from_schematic_file", lambda _: BlockModel.from_schematic_file(schematic_path, mode=mode), lambda: None),
+        ("_process", lambda model: model._process(), fresh),
+        ("_make_stl", lambda model: model._make_stl(), meshed),
+    ]
+    for name, method, needs_mesh in EXPORTERS:
+        stages.append((name, lambda model, method=method: getattr(model, method)(), meshed if needs_mesh else fresh))
+    return stages
+
+
+def run(shapes, sizes, mode, repeat, memory):
+    results = []
+    directory = tempfile.mkdtemp()
+    try:
+        for shape in shapes:
+            for size in sizes:
+                for stage, timed, setup in get_stages(shape, size, mode, directory):
+                    seconds, peak = measure(timed, setup, repeat, memory)
+                    result = {"shape": shape, "size": size, "mode": mode, "stage": stage,
+                              "seconds": seconds, "peak_bytes": peak}
+                    results.append(result)
+                    print("%-8s %4i %-20s %10.4fs %12s" % (shape, size, stage, seconds,
+                                                           "-" if peak is None else "%.1fMB" % (peak / 1048576.0)))
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the results that are slower than the baseline by more than tolerance.
+    """
+    def key(r):
+        return r["shape"], r["size"], r["mode"], r["stage"]
+
+    saved = dict((key(r), r) for r in baseline)
+    slower = []
+    for result in results:
+        before = saved.get(key(result))
+        if before is not None and result["seconds"] > before["seconds"] * tolerance:
+            slower.append((result, before))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark blockmodel on synthetic models")
+    parser.add_argument("--shapes", default=",".join(sorted(SHAPES)), help="comma separated, from %s" % ", ".join(sorted(SHAPES)))
+    parser.add_argument("--sizes", default="16,32", help="comma separated edge lengths in blocks")
+    parser.add_argument("--mode", default="default", choices=MODES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs")
+    parser.add_argument("--output", help="save the results as json")
+    parser.add_argument("--compare", help="json results to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="how many times slower counts as a regression")
+    args = parser.parse_args(argv)
+
+    shapes = args.shapes.split(",")
+    for shape in shapes:
+        if shape not in SHAPES:
+            parser.error("Unrecognised shape %s" % shape)
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    results = run(shapes, sizes, args.mode, args.repeat, not args.no_memory)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare, "r") as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        for result, before in slower:
+            print("SLOWER %s %s %s %s: %.4fs was %.4fs" % (result["shape"], result["size"], result["mode"],
+                                                          result["stage"], result["seconds"], before["seconds"]))
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Synthetic models for the benchmarks, each a dict of (x, y, z) to
+(block_id, block_data) plus its size, and the conversions to each input
+format BlockModel reads.
+"""
+import json
+import random
+import struct
+import zlib
+
+from blockmodel import BlockModel
+
+STONE = (1, 0)
+STAIR_IDS = (53, 67, 108)
+SLAB = 44
+
+
+def solid(size, rng):
+    return dict(((x, y, z), STONE) for x in range(size) for y in range(size) for z in range(size))
+
+
+def shell(size, rng):
+    edge = size - 1
+    return dict(((x, y, z), STONE) for x in range(size) for y in range(size) for z in range(size)
+                if x in (0, edge) or y in (0, edge) or z in (0, edge))
+
+
+def noise(size, rng):
+    choices = [(1, 0), (2, 0), (3, 0), (4, 0), (5, 0), (17, 2), (35, 14), (SLAB, 0), (SLAB, 8), (53, 1)]
+    return dict(((x, y, z), rng.choice(choices)) for x in range(size) for y in range(size) for z in range(size)
+                if rng.random() < 0.5)
+
+
+def stairs(size, rng):
+    # mostly stairs facing every which way, with slabs and a few cubes
+    blocks = {}
+    for x in range(size):
+        for y in range(size):
+            for z in range(size):
+                roll = rng.random()
+                if roll < 0.6:
+                    blocks[(x, y, z)] = (rng.choice(STAIR_IDS), rng.randrange(8))
+                elif roll < 0.75:
+                    blocks[(x, y, z)] = (SLAB, rng.choice((0, 8)))
+                elif roll < 0.85:
+                    blocks[(x, y, z)] = STONE
+    return blocks
+
+
+def sparse(size, rng):
+    # a few short pillars scattered through a big empty box
+    blocks = {}
+    for _ in range(max(size * size // 16, 1)):
+        x, z = rng.randrange(size), rng.randrange(size)
+        for y in range(rng.randrange(1, 4)):
+            blocks[(x, min(y, size - 1), z)] = STONE
+    # pin the corners so the bounding box is the full size
+    blocks[(0, 0, 0)] = STONE
+    blocks[(size - 1, size - 1, size - 1)] = STONE
+    return blocks
+
+
+SHAPES = {
+    "solid": solid,
+    "shell": shell,
+    "noise": noise,
+    "stairs": stairs,
+    "sparse": sparse,
+}
+
+
+def make_volume(shape, size, seed=0):
+    return SHAPES[shape](size, random.Random(seed))
+
+
+def to_json(blocks, size):
+    return json.dumps([[[list(blocks.get((x, y, z), (0, 0))) for z in range(size)]
+                        for y in range(size)] for x in range(size)])
+
+
+def to_sparse_json(blocks):
+    return json.dumps([[x, y, z, b[0], b[1]] for (x, y, z), b in sorted(blocks.items())])
+
+
+def _png_chunk(tag, data):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+
+def to_png(blocks, size):
+    # png models are a single layer of block ids, take the bottom one as an
+    # 8 bit greyscale image
+    raw = b"".join(b"\x00" + bytes(bytearray(blocks.get((x, 0, z), (0, 0))[0] for x in range(size)))
+                   for z in range(size))
+    return (b"\x89PNG\r\n\x1a\n" +
+            _png_chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 0, 0, 0, 0)) +
+            _png_chunk(b"IDAT", zlib.compress(raw)) +
+            _png_chunk(b"IEND", b""))
+
+
+def to_schematic(blocks, size, path):
+    with open(path, "wb") as f:
+        f.write(BlockModel.from_json(to_json(blocks, size)).schematic)
@@ -18,6 +18,7 @@ setup(name='blockmodel',
     ],
     keywords='minecraft 3D printing',
     install_requires=['nbt', 'jinja2'],
+    extras_require={'vectorized': ['numpy']},
     packages=find_packages('src'),
     package_dir={'': 'src'},
     include_package_data=True,
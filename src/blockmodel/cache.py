@@ -0,0 +1,172 @@
+import os
+import json
+import hashlib
+import tempfile
+from collections import OrderedDict
+
+from blockmodel.model import BlockModel
+from blockmodel.constants import MODE_DEFAULT
+
+# bump when a change to meshing or the exporters makes old entries wrong
+CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# the from_ classmethod for each kind of source
+SOURCES = {
+    "json": BlockModel.from_json,
+    "png": BlockModel.from_png,
+    "sparse_json": BlockModel.from_sparse_json,
+    "schematic": BlockModel.from_schematic_file,
+}
+
+# outputs by property name, text ones are stored as utf-8
+TEXT_OUTPUTS = ("obj", "x3d", "x3d_triangles", "x3d_faces", "x3d_indexed", "collada", "csv")
+BINARY_OUTPUTS = ("stl", "glb", "ply", "ply_blocks", "three_mf", "schematic")
+
+# options passed on to the model that change nothing in its outputs
+UNKEYED_OPTIONS = ("workers", "stats", "cache_limit")
+
+# those only some kinds of source take
+SOURCE_OPTIONS = {"schematic": ("mapped",)}
+
+TEMP_SUFFIX = ".tmp"
+
+replace = getattr(os, "replace", os.rename)
+
+
+class ConversionCache(object):
+    """
+    Keeps converted outputs on disk, keyed by a hash of the source and the
+    options that change the output, so converting the same build again is a
+    file read.
+
+    The directory holds at most max_bytes of outputs, the least recently used
+    are deleted to make room. Each cache keeps its own record of the entries
+    so when processes share a directory the limit is only approximate.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        if not os.path.isdir(directory):
+            raise Exception("The cache directory %s does not exist. Create it first" % directory)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._load_entries()
+
+    def _load_entries(self):
+        # oldest first, as the eviction order
+        found = []
+        for name in os.listdir(self.directory):
+            # only ever evict files the cache made
+            digest, _, output = name.partition(".")
+            if len(digest) != 64 or (output not in TEXT_OUTPUTS and output not in BINARY_OUTPUTS):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            found.append((stat.st_mtime, name, stat.st_size))
+        self.entries = OrderedDict((name, size) for _, name, size in sorted(found))
+        self.size = sum(self.entries.values())
+
+    def get_key(self, source, source_type, output, max_size=None, scale=None, mode=MODE_DEFAULT, greedy=None):
+        """
+        Returns the name an output is stored under, the sha256 of the source
+        and everything that changes the output.
+        """
+        params = {"version": CACHE_VERSION, "source_type": source_type, "output": output,
+                  "max_size": max_size, "scale": scale, "mode": mode, "greedy": greedy}
+        digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8"))
+        if source_type == "schematic":
+            # schematics are read from a file
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        else:
+            digest.update(source.encode("utf-8") if not isinstance(source, bytes) else source)
+        return "%s.%s" % (digest.hexdigest(), output)
+
+    def convert(self, source, source_type, output, max_size=None, scale=None, **kwargs):
+        """
+        Returns source converted to output, from the cache if it is there.
+
+        source_type is one of json, png, sparse_json or schematic, which
+        is a file path, and output the name of one of BlockModel's outputs
+        such as stl or obj. scale, if given, is the size of a block in the
+        3D outputs, the model's own default is 2. Other keyword arguments are
+        passed to the model.
+        """
+        if source_type not in SOURCES:
+            raise Exception("Unrecognised source type %s" % source_type)
+        if output not in TEXT_OUTPUTS and output not in BINARY_OUTPUTS:
+            raise Exception("Unrecognised output %s" % output)
+        keyed = {}
+        for name in kwargs:
+            if name in ("mode", "greedy"):
+                keyed[name] = kwargs[name]
+            elif name not in UNKEYED_OPTIONS and name not in SOURCE_OPTIONS.get(source_type, ()):
+                raise Exception("The cache can't convert with %s" % name)
+
+        key = self.get_key(source, source_type, output, max_size, scale, **keyed)
+        data = self._read(key)
+        if data is None:
+            self.misses += 1
+            model = SOURCES[source_type](source, max_size, **kwargs)
+            if scale is not None:
+                model.scale = scale
+                model.stl_scale = float(scale)
+            converted = getattr(model, output)
+            if kwargs.get("mapped"):
+                # the model is done with, so let go of the mapping
+                model.reader.close()
+            self._write(key, converted.encode("utf-8") if output in TEXT_OUTPUTS else converted)
+            return converted
+        self.hits += 1
+        return data.decode("utf-8") if output in TEXT_OUTPUTS else data
+
+    def _read(self, key):
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # the file's time keeps its place in the order for the next cache
+            os.utime(path, None)
+        except (IOError, OSError):
+            # never stored or removed by another process
+            self._forget(key)
+            return None
+        self._forget(key)
+        self.entries[key] = len(data)
+        self.size += len(data)
+        return data
+
+    def _write(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        self._forget(key)
+        # evict the least recently used entries to stay under the limit
+        while self.entries and self.size + len(data) > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+        handle, temp_path = tempfile.mkstemp(suffix=TEMP_SUFFIX, dir=self.directory)
+        with os.fdopen(handle, "wb") as f:
+            f.write(data)
+        # readers only ever see whole files
+        replace(temp_path, os.path.join(self.directory, key))
+        self.entries[key] = len(data)
+        self.size += len(data)
+
+    def _forget(self, key):
+        size = self.entries.pop(key, None)
+        if size is not None:
+            self.size -= size
+
+    def _remove(self, key):
+        self._forget(key)
+        try:
+            os.remove(os.path.join(self.directory, key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for key in list(self.entries):
+            self._remove(key)
@@ -7,9 +7,30 @@ SIDE_BACK   = 5
 
 ALL_SIDES = (0,1,2,3,4,5)
 
+# offset to the neighbouring block for each side
+SIDE_NEIGHBOURS = ((0, 1, 0), (0, -1, 0), (-1, 0, 0), (1, 0, 0), (0, 0, 1), (0, 0, -1))
+
+# corners of each side of the unit cube, in the order faces are wound
+SIDE_CORNERS = (
+    ((0, 1, 0), (0, 1, 1), (1, 1, 1), (1, 1, 0)),
+    ((1, 0, 0), (1, 0, 1), (0, 0, 1), (0, 0, 0)),
+    ((0, 1, 0), (0, 0, 0), (0, 0, 1), (0, 1, 1)),
+    ((1, 1, 1), (1, 0, 1), (1, 0, 0), (1, 1, 0)),
+    ((0, 1, 1), (0, 0, 1), (1, 0, 1), (1, 1, 1)),
+    ((1, 1, 0), (1, 0, 0), (0, 0, 0), (0, 1, 0)),
+)
+
 HALFSLAB_BLOCKS = (44, 126)
 STAIR_BLOCKS = (53, 67, 108, 109, 114, 128, 134, 135, 136, 156)
 
+# block type codes used in the mapper's lookup table
+TYPE_NONE = 0
+TYPE_CUBE = 1
+TYPE_HALFSLAB = 2
+TYPE_STAIR = 3
+
+TYPE_CODES = {"cube": TYPE_CUBE, "halfslab": TYPE_HALFSLAB, "stair": TYPE_STAIR}
+
 
 STAIR_EAST = 0
 STAIR_WEST = 1
@@ -18,4 +39,19 @@ STAIR_NORTH = 3
 STAIR_EAST_UD = 4
 STAIR_WEST_UD = 5
 STAIR_SOUTH_UD = 6
-STAIR_NORTH_UD = 7
\ No newline at end of file
+STAIR_NORTH_UD = 7
+
+MODE_DEFAULT = "default"
+MODE_VECTORIZED = "vectorized"
+MODE_HALF_GRID = "halfgrid"
+
+MODES = (MODE_DEFAULT, MODE_VECTORIZED, MODE_HALF_GRID)
+
+GREEDY_TEXTURE = "texture"
+GREEDY_ALL = "all"
+
+GREEDY_MODES = (None, False, True, GREEDY_TEXTURE, GREEDY_ALL)
+
+# vertices are keyed on the half block lattice, each coordinate doubled and
+# packed into one int this many bits apart
+VERTEX_BITS = 21
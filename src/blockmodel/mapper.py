@@ -1,9 +1,89 @@
 import os
+from array import array
 from blockmodel.constants import *
+from blockmodel.readers import png
 
 THIS_DIR = os.path.dirname(__file__)
 RESOURCES_ROOT = os.path.join(os.path.dirname(__file__), "resources")
 
+# the lookup table has a slot for every id and data value, (id << 4) | data
+TABLE_IDS = 4096
+TABLE_DATA = 16
+TABLE_SIZE = TABLE_IDS * TABLE_DATA
+
+# texture tiles kept per slot, in this order
+TABLE_UVS = ("top", "side", "bottom")
+
+# terrain.png is a grid of TILES by TILES tiles, counted from the bottom left
+TILES = 16
+
+# the quadrants a stair is missing for each data value and the x, z step
+# from it to the block behind
+STAIR_MISSING = (((0, 1, 0), (0, 1, 1), (1, 0)),#east
+                 ((1, 1, 1), (1, 1, 0), (-1, 0)),#west
+                 ((0, 1, 0), (1, 1, 0), (0, 1)),#south
+                 ((1, 1, 1), (0, 1, 1), (0, -1)),#north
+                 ((0, 0, 0), (0, 0, 1), (1, 0)),#east
+                 ((1, 0, 1), (1, 0, 0), (-1, 0)),#west
+                 ((0, 0, 0), (1, 0, 0), (0, 1)),#south
+                 ((1, 0, 1), (0, 0, 1), (0, -1)))
+
+# stands in for the data of a neighbour that is not a stair
+STAIR_NONE = len(STAIR_MISSING)
+STAIR_NEIGHBOURS = STAIR_NONE + 1
+
+STAIR_IDS = frozenset(STAIR_BLOCKS)
+
+
+def quadrant_bit(xx, yy, zz):
+    """
+    Returns the bit for one of a block's 2x2x2 quadrants in an occupancy mask.
+    """
+    return 1 << ((xx << 2) | (yy << 1) | zz)
+
+
+HALFSLAB_LOWER = quadrant_bit(0, 0, 0) | quadrant_bit(0, 0, 1) | quadrant_bit(1, 0, 0) | quadrant_bit(1, 0, 1)
+HALFSLAB_UPPER = HALFSLAB_LOWER << 2
+FULL_BLOCK = 0xFF
+
+
+def _make_stair_quadrants():
+    """
+    Returns the occupancy masks of a stair for every data value and the data
+    of the stairs behind and in front of it, index them with stair_index.
+
+    A missing quadrant is filled in when the stair behind, the same way up,
+    is solid just behind it, which makes inside corners. A solid quadrant is
+    cut away when the stair in front is missing just in front of it, which
+    makes outside corners.
+    """
+    table = bytearray(STAIR_NEIGHBOURS * STAIR_NEIGHBOURS * STAIR_NONE)
+    for data, missing in enumerate(STAIR_MISSING):
+        behindx, behindz = missing[2]
+        for behind in range(STAIR_NEIGHBOURS):
+            for front in range(STAIR_NEIGHBOURS):
+                mask = 0
+                for xx in (0, 1):
+                    for yy in (0, 1):
+                        for zz in (0, 1):
+                            if (xx, yy, zz) in missing:
+                                solid = (behind != STAIR_NONE and (data < 4) == (behind < 4) and
+                                         (xx + behindx, yy, zz + behindz) not in STAIR_MISSING[behind])
+                            else:
+                                solid = not (front != STAIR_NONE and (data < 4) == (front < 4) and
+                                             (xx - behindx, yy, zz - behindz) in STAIR_MISSING[front])
+                            if solid:
+                                mask |= quadrant_bit(xx, yy, zz)
+                table[stair_index(data, behind, front)] = mask
+    return table
+
+
+def stair_index(data, behind, front):
+    return (data * STAIR_NEIGHBOURS + behind) * STAIR_NEIGHBOURS + front
+
+
+STAIR_QUADRANTS = _make_stair_quadrants()
+
 
 class MinecraftBlock(object):
 
@@ -19,6 +99,12 @@ class MinecraftBlock(object):
         self.top_texname = attrs[11] if attrs[11] != "" else None
         self.bottom_uv = (int(attrs[13]), int(attrs[14])) if attrs[13] != "" else None
         self.bottom_texname = attrs[15] if attrs[15] != "" else None
+        self.block_type = self.get_block_type()
+        self.type_code = TYPE_CODES[self.block_type]
+        # the tile for each side, as get_tex_uv
+        self.tex_uvs = tuple(self.top_uv or self.uv if side == SIDE_TOP else
+                             self.bottom_uv or self.uv if side == SIDE_BOTTOM else
+                             self.uv for side in ALL_SIDES)
 
     def get_index(self):
         if self.block_data is None:
@@ -36,11 +122,22 @@ class MinecraftBlock(object):
     def __str__(self):
         return "%s block" % self.commonname
 
-    block_type = property(get_block_type)
-
 
 class MinecraftBlockMapper(object):
 
+    _shared = None
+
+    @classmethod
+    def get_shared(cls):
+        """
+        Returns a mapper shared by every model in the process, so blocks.csv
+        is only read once. Models never change their mapper, nor should you
+        change this one.
+        """
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
     def __init__(self):
         self.lu = {}
 
@@ -56,94 +153,155 @@ class MinecraftBlockMapper(object):
                 #print "fucked up %s %s" % (attrs, e)
                 pass
         f.close()
+        self._make_table()
+        self._tile_colours = None
 
-    def can_render(self, block_id, block_data):
+    def _make_table(self):
+        """
+        Flattens lu into arrays indexed by (block_id << 4) | block_data.
+
+        block_index points into blocks, whose last entry is None so that the
+        -1 of an empty slot needs no special case. block_types holds the
+        TYPE_ codes and block_uvs the top, side and bottom tiles as six bytes
+        per slot. tile_names has the texture name of each tile used.
+        """
+        self.blocks = []
+        self.tile_names = {}
+        self.block_index = array("h", [-1]) * TABLE_SIZE
+        self.block_types = bytearray(TABLE_SIZE)
+        self.block_uvs = array("B", [0]) * (TABLE_SIZE * 2 * len(TABLE_UVS))
+
+        def fill(block, start, stop):
+            i = len(self.blocks)
+            self.blocks.append(block)
+            for uv, name in ((block.uv, block.texname), (block.top_uv, block.top_texname), (block.bottom_uv, block.bottom_texname)):
+                if uv is not None:
+                    self.tile_names.setdefault(uv, name)
+            uvs = block.tex_uvs[SIDE_TOP] + block.tex_uvs[SIDE_LEFT] + block.tex_uvs[SIDE_BOTTOM]
+            for slot in range(start, stop):
+                self.block_index[slot] = i
+                self.block_types[slot] = block.type_code
+                self.block_uvs[slot * 6:slot * 6 + 6] = array("B", uvs)
+
+        # blocks found by id alone win over those with data so go last
+        for key, block in self.lu.items():
+            if isinstance(key, tuple) and key[0] < TABLE_IDS and 0 <= key[1] < TABLE_DATA:
+                fill(block, (key[0] << 4) | key[1], ((key[0] << 4) | key[1]) + 1)
+        for key, block in self.lu.items():
+            if not isinstance(key, tuple) and key < TABLE_IDS:
+                fill(block, key << 4, (key + 1) << 4)
+        self.blocks.append(None)
+
+    def lookup(self, block_id, block_data):
+        if 0 <= block_id < TABLE_IDS and 0 <= block_data < TABLE_DATA:
+            return self.blocks[self.block_index[(block_id << 4) | block_data]]
+        # outside the table, only blocks matching any data can be found
         block = self.lu.get(block_id)
         if not block:
             block = self.lu.get((block_id, block_data))
-        return block is not None
+        return block
+
+    def can_render(self, block_id, block_data):
+        return self.lookup(block_id, block_data) is not None
 
     def get_block(self, x, y, z, accessor):
         block_id, block_data = accessor.get(x, y, z)
-        block = self.lu.get(block_id)
-        if not block:
-            block = self.lu.get((block_id, block_data))
-        return block
+        if 0 <= block_id < TABLE_IDS and 0 <= block_data < TABLE_DATA:
+            return self.blocks[self.block_index[(block_id << 4) | block_data]]
+        return self.lookup(block_id, block_data)
 
-    def is_blank(self, x, y, z, xd, yd, zd, accessor):
+    def _get_type_code(self, block_id, block_data):
+        if 0 <= block_id < TABLE_IDS and 0 <= block_data < TABLE_DATA:
+            return self.block_types[(block_id << 4) | block_data]
+        block = self.lookup(block_id, block_data)
+        return block.type_code if block is not None else TYPE_NONE
 
+    def _get_stair_data(self, x, y, z, accessor):
         block_id, block_data = accessor.get(x, y, z)
-        #print block_id, block_data
-        block = self.lu.get(block_id)
+        if block_id in STAIR_IDS and 0 <= block_data < STAIR_NONE:
+            return block_data
+        return STAIR_NONE
 
-        if not block:
-            block = self.lu.get((block_id, block_data))
+    def get_quadrants(self, x, y, z, accessor):
+        """
+        Returns the occupancy mask of the block at x, y, z, see quadrant_bit.
+        """
+        block_id, block_data = accessor.get(x, y, z)
+        type_code = self._get_type_code(block_id, block_data)
+        if type_code == TYPE_CUBE:
+            return FULL_BLOCK
+        if type_code == TYPE_HALFSLAB:
+            return HALFSLAB_LOWER if block_data < 8 else HALFSLAB_UPPER
+        if type_code == TYPE_STAIR:
+            behindx, behindz = STAIR_MISSING[block_data][2]
+            behind = self._get_stair_data(x - behindx, y, z - behindz, accessor)
+            front = self._get_stair_data(x + behindx, y, z + behindz, accessor)
+            return STAIR_QUADRANTS[stair_index(block_data, behind, front)]
+        return 0
 
-        #print "block", block
-        if not block:
-            #print "failed to find %s %s" % (block_id, block_data)
-            #print self.lu.keys()
+    def is_blank(self, x, y, z, xd, yd, zd, accessor):
+
+        block_id, block_data = accessor.get(x, y, z)
+        type_code = self._get_type_code(block_id, block_data)
+
+        if type_code == TYPE_NONE:
             return True
 
-        if block.block_type == "cube":
+        if type_code == TYPE_CUBE:
             return False
 
-        if block.block_type == "halfslab":
+        if type_code == TYPE_HALFSLAB:
             if block_data < 8:
                 return yd == 0.5
             else:
                 return yd == 0.0
 
-        if block.block_type == "stair":
-
-            xx = int(2.0 * xd)
-            yy = int(2.0 * yd)
-            zz = int(2.0 * zd)
-
-            missingblocks = self.get_missing_blocks(block_data)
-            behindx = missingblocks[2][0]
-            behindz = missingblocks[2][1]
-
-            ##now horrid messing around to do the corners
-            if (xx, yy, zz) in missingblocks:
-                blank = True
-                blockbehind_id, blockbehind_data = accessor.get(x - behindx, y, z - behindz)
-                if blockbehind_id in STAIR_BLOCKS:
-                    #if they are the same way up
-                    if (block_data < 4) == (blockbehind_data < 4):
-                        #see if the block quadrant behind is solid
-                        behindmissingblocks = self.get_missing_blocks(blockbehind_data)
-                        if (xx + behindx, yy, zz + behindz) not in behindmissingblocks:
-                            blank = False
+        if type_code == TYPE_STAIR:
+            bit = quadrant_bit(int(2.0 * xd), int(2.0 * yd), int(2.0 * zd))
+            behindx, behindz = STAIR_MISSING[block_data][2]
+            # only the stair behind can fill a missing quadrant and only the
+            # one in front can cut away a solid one
+            if STAIR_QUADRANTS[stair_index(block_data, STAIR_NONE, STAIR_NONE)] & bit:
+                front = self._get_stair_data(x + behindx, y, z + behindz, accessor)
+                mask = STAIR_QUADRANTS[stair_index(block_data, STAIR_NONE, front)]
             else:
-                blank = False
-                blockbehind_id, blockbehind_data = accessor.get(x + behindx, y, z + behindz)
-                if blockbehind_id in STAIR_BLOCKS:
-                    #if they are the same way up
-                    if (block_data < 4) == (blockbehind_data < 4):
-                        #see if the block quadrant behind is blank
-                        behindmissingblocks = self.get_missing_blocks(blockbehind_data)
-                        if (xx - behindx, yy, zz - behindz) in behindmissingblocks:
-                            blank = True
-            return blank
+                behind = self._get_stair_data(x - behindx, y, z - behindz, accessor)
+                mask = STAIR_QUADRANTS[stair_index(block_data, behind, STAIR_NONE)]
+            return not mask & bit
         return True
 
     def get_missing_blocks(self, block_data):
+        return STAIR_MISSING[block_data]
 
-            missingblockslu = (((0, 1, 0), (0, 1, 1), (1, 0)),#east
-                                ((1, 1, 1), (1, 1, 0), (-1, 0)),#west
-                                ((0, 1, 0), (1, 1, 0), (0, 1)),#south
-                                ((1, 1, 1), (0, 1, 1), (0, -1)),#north
-                                ((0, 0, 0), (0, 0, 1), (1, 0)),#east
-                                ((1, 0, 1), (1, 0, 0), (-1, 0)),#west
-                                ((0, 0, 0), (1, 0, 0), (0, 1)),#south
-                                ((1, 0, 1), (0, 0, 1), (0, -1)))
+    def get_tex_uv(self, block, side):
+        return block.tex_uvs[side]
 
-            return missingblockslu[block_data]
+    def get_tile_colour(self, tex_x, tex_y):
+        """
+        Returns the average colour of a tile of terrain.png as (r, g, b),
+        weighted by alpha so see through pixels count less. Tiles with
+        nothing visible are white.
+        """
+        if self._tile_colours is None:
+            self._tile_colours = self._average_tiles()
+        return self._tile_colours[tex_y * TILES + tex_x]
 
-    def get_tex_uv(self, block, side):
-        if side == SIDE_TOP and block.top_uv is not None:
-            return block.top_uv
-        if side == SIDE_BOTTOM and block.bottom_uv is not None:
-            return block.bottom_uv
-        return block.uv
\ No newline at end of file
+    def get_tile_name(self, tex_x, tex_y):
+        return self.tile_names.get((tex_x, tex_y), "tile_%i_%i" % (tex_x, tex_y))
+
+    def _average_tiles(self):
+        width, height, rows, _ = png.Reader(filename=os.path.join(RESOURCES_ROOT, "terrain.png")).asRGBA8()
+        size = width // TILES
+        totals = [[0, 0, 0, 0] for _ in range(TILES * TILES)]
+        for y, row in enumerate(rows):
+            row = list(row)
+            # the image's rows run top down, tiles bottom up
+            tile_row = (TILES - 1 - y // size) * TILES
+            for x in range(0, width * 4, 4):
+                alpha = row[x + 3]
+                total = totals[tile_row + x // 4 // size]
+                total[0] += row[x] * alpha
+                total[1] += row[x + 1] * alpha
+                total[2] += row[x + 2] * alpha
+                total[3] += alpha
+        return [(r // a, g // a, b // a) if a else (255, 255, 255) for r, g, b, a in totals]
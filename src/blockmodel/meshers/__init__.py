@@ -0,0 +1,11 @@
+from .vectorized import VectorizedMesher
+from .greedy import GreedyMerger
+from .half_grid import HalfGridMesher
+from .parallel import ParallelMesher
+
+__all__ = (
+    "VectorizedMesher",
+    "GreedyMerger",
+    "HalfGridMesher",
+    "ParallelMesher",
+)
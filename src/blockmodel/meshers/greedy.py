@@ -0,0 +1,90 @@
+from blockmodel.constants import *
+
+# the axis a face lies across and the two axes it spans, for each side
+SIDE_AXES = (
+    (1, 0, 2),
+    (1, 0, 2),
+    (0, 2, 1),
+    (0, 2, 1),
+    (2, 0, 1),
+    (2, 0, 1),
+)
+
+
+class GreedyMerger(object):
+    """
+    Collects full block faces and merges coplanar neighbours into rectangles.
+
+    Faces are grouped by side, plane and texture tile, or by side and plane
+    alone when any_texture is set, which only makes sense for untextured
+    output such as STL. Each group is covered with maximal rectangles by
+    growing along the first axis then the second. A merged face stretches
+    one copy of its tile over the whole rectangle and takes the block id of
+    its first cell. Rectangles are not split where their neighbours' corners
+    meet their edges, so the mesh has T-junctions there.
+    """
+
+    def __init__(self, any_texture=False, unit=1):
+        self.any_texture = any_texture
+        # the size of a cell in blocks
+        self.unit = unit
+        self.groups = {}
+
+    def add(self, x, y, z, side, tex_x, tex_y, block_id=0):
+        position = (x, y, z)
+        plane_axis, u_axis, v_axis = SIDE_AXES[side]
+        tile = (tex_x, tex_y)
+        key = (side, position[plane_axis]) if self.any_texture else (side, position[plane_axis], tile)
+        cells = self.groups.get(key)
+        if cells is None:
+            cells = self.groups[key] = {}
+        cells.setdefault((position[v_axis], position[u_axis]), (tex_x, tex_y, block_id))
+
+    def update(self, groups):
+        """
+        Adds the faces collected by another merger.
+        """
+        for key, cells in groups.items():
+            mine = self.groups.get(key)
+            if mine is None:
+                self.groups[key] = dict(cells)
+            else:
+                for cell, tile in cells.items():
+                    mine.setdefault(cell, tile)
+
+    def add_to(self, model):
+        for key in sorted(self.groups):
+            side, plane = key[0], key[1]
+            for u, v, width, height, tile in self._merge(self.groups[key]):
+                corners = self._get_corners(side, plane, u, v, width, height)
+                model._add_textured_face(corners, tile[0], tile[1], side, block_id=tile[2])
+        self.groups = {}
+
+    def _merge(self, cells):
+        rects = []
+        for v, u in sorted(cells):
+            tile = cells.get((v, u))
+            if tile is None:
+                continue
+            width = 1
+            while (v, u + width) in cells:
+                width += 1
+            height = 1
+            while all((v + height, u + i) in cells for i in range(width)):
+                height += 1
+            for j in range(height):
+                for i in range(width):
+                    del cells[(v + j, u + i)]
+            rects.append((u, v, width, height, tile))
+        return rects
+
+    def _get_corners(self, side, plane, u, v, width, height):
+        plane_axis, u_axis, v_axis = SIDE_AXES[side]
+        origin = [0, 0, 0]
+        size = [1, 1, 1]
+        origin[plane_axis] = plane
+        origin[u_axis] = u
+        origin[v_axis] = v
+        size[u_axis] = width
+        size[v_axis] = height
+        return [tuple((origin[i] + corner[i] * size[i]) * self.unit for i in range(3)) for corner in SIDE_CORNERS[side]]
@@ -0,0 +1,181 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from blockmodel.constants import *
+
+from blockmodel.mapper import STAIR_MISSING, STAIR_NONE, STAIR_NEIGHBOURS, STAIR_QUADRANTS
+from blockmodel.mapper import FULL_BLOCK, HALFSLAB_LOWER, HALFSLAB_UPPER
+from .vectorized import VectorizedMesher, TILE_CORNERS
+
+# stairs reach one block out for their corners and their neighbours' faces
+# reach one further
+HALO = 2
+
+# offsets from the first texture vertex of a quadrant's tile to its corners
+QUAD_CORNERS = (33, 0, 1, 34)
+
+# how each side's quadrant picks its quarter of the tile, as
+# _get_quadrant_corners_quads, ((flip, axis) for quad_x, (flip, axis) for quad_y)
+SIDE_QUADS = (
+    ((False, 0), (True, 2)),
+    ((True, 0), (True, 2)),
+    ((False, 2), (False, 1)),
+    ((True, 2), (False, 1)),
+    ((False, 0), (False, 1)),
+    ((True, 0), (False, 1)),
+)
+
+
+class HalfGridMesher(VectorizedMesher):
+    """
+    Meshes a BlockModel on a grid of half blocks with numpy.
+
+    Each block is rasterised into its 2x2x2 quadrants with the mapper's slab
+    and stair rules and the exposed quadrant faces are found with array
+    shifts, so every block type takes the same path. Where all four quadrants
+    on a side of a cube are exposed they make one full face. The faces cover
+    the same surface as the other modes but are split and ordered
+    differently, block by block then side by side.
+    """
+
+    def _mesh_chunk(self, x_start, x_stop):
+        model = self.model
+        self.x_origin = x_start - HALO
+        ids, data, kind = self._load_kinds(x_start, x_stop, HALO)
+        masks = self._get_masks(ids, data, kind)
+
+        inner = kind[HALO:-HALO]
+        model._volume += (int(np.count_nonzero(inner == TYPE_CUBE)) +
+                         int(np.count_nonzero(inner == TYPE_HALFSLAB)) / 2.0 +
+                         int(np.count_nonzero(inner == TYPE_STAIR)) * 3.0 / 4.0) * model.stl_scale ** 3
+
+        # the quadrants of the slab and the blocks either side of it
+        occupied = self._rasterise(masks[HALO - 1:1 - HALO])
+        padded = np.pad(occupied, ((0, 0), (1, 1), (1, 1)), mode="constant")
+        w, h, d = inner.shape
+        solid = occupied[2:-2]
+        cube = inner == TYPE_CUBE
+
+        faces = []
+        for side in ALL_SIDES:
+            dx, dy, dz = SIDE_NEIGHBOURS[side]
+            neighbour = padded[2 + dx:2 + dx + w * 2, 1 + dy:1 + dy + h * 2, 1 + dz:1 + dz + d * 2]
+            exposed = solid & ~neighbour
+
+            # the four quadrants on this side of each block
+            quads = exposed.reshape(w, 2, h, 2, d, 2)
+            for axis, step in enumerate((dx, dy, dz)):
+                if step:
+                    quads = np.take(quads, [1 if step > 0 else 0], axis=axis * 2 + 1)
+            # the greedy merger makes its own full faces
+            full = cube & quads.all(axis=(1, 3, 5)) & (model.greedy_merger is None)
+            exposed &= ~full.repeat(2, 0).repeat(2, 1).repeat(2, 2)
+
+            bx, by, bz = np.nonzero(full)
+            faces.append((bx * 2, by * 2, bz * 2, side, 2))
+            hx, hy, hz = np.nonzero(exposed)
+            faces.append((hx, hy, hz, side, 1))
+
+        hx = np.concatenate([f[0] for f in faces])
+        hy = np.concatenate([f[1] for f in faces])
+        hz = np.concatenate([f[2] for f in faces])
+        fside = np.concatenate([np.full(len(f[0]), f[3], dtype=np.int64) for f in faces])
+        size = np.concatenate([np.full(len(f[0]), f[4], dtype=np.int64) for f in faces])
+
+        # block by block in x, y, z order like the other modes, so slabs
+        # meshed apart join up in the same order
+        block_keys = (((hx // 2) * h + hy // 2) * d + hz // 2) * len(ALL_SIDES) + fside
+        quadrant_keys = ((hx % 2) << 2) | ((hy % 2) << 1) | (hz % 2)
+        order = np.lexsort((quadrant_keys, -size, block_keys))
+        hx = hx[order] + x_start * 2
+        self._add_half_faces(hx, hy[order], hz[order], fside[order], size[order], ids, data)
+
+    def _get_masks(self, ids, data, kind):
+        """
+        Returns the quadrant occupancy mask of every block, as the mapper's
+        get_quadrants. Stair data above 7 is taken as its lowest three bits.
+        """
+        masks = np.zeros(kind.shape, dtype=np.uint8)
+        masks[kind == TYPE_CUBE] = FULL_BLOCK
+        slab = kind == TYPE_HALFSLAB
+        masks[slab & (data < 8)] = HALFSLAB_LOWER
+        masks[slab & (data >= 8)] = HALFSLAB_UPPER
+
+        stair = kind == TYPE_STAIR
+        if not stair.any():
+            return masks
+        stair_data = np.where(np.isin(ids, STAIR_BLOCKS) & (data < STAIR_NONE), data, STAIR_NONE)
+        padded = np.pad(stair_data, 1, mode="constant", constant_values=STAIR_NONE)
+        own = data & 7
+        behind = np.full(kind.shape, STAIR_NONE, dtype=np.uint8)
+        front = np.full(kind.shape, STAIR_NONE, dtype=np.uint8)
+        w, h, d = kind.shape
+        for value, missing in enumerate(STAIR_MISSING):
+            bx, bz = missing[2]
+            facing = stair & (own == value)
+            behind[facing] = padded[1 - bx:1 - bx + w, 1:-1, 1 - bz:1 - bz + d][facing]
+            front[facing] = padded[1 + bx:1 + bx + w, 1:-1, 1 + bz:1 + bz + d][facing]
+        table = np.frombuffer(STAIR_QUADRANTS, dtype=np.uint8)
+        # widened so the index into the table does not overflow a byte
+        index = (own[stair].astype(np.intp) * STAIR_NEIGHBOURS + behind[stair]) * STAIR_NEIGHBOURS + front[stair]
+        masks[stair] = table[index]
+        return masks
+
+    def _rasterise(self, masks):
+        w, h, d = masks.shape
+        occupied = np.zeros((w * 2, h * 2, d * 2), dtype=bool)
+        for xx in (0, 1):
+            for yy in (0, 1):
+                for zz in (0, 1):
+                    bit = (xx << 2) | (yy << 1) | zz
+                    occupied[xx::2, yy::2, zz::2] = (masks >> bit) & 1
+        return occupied
+
+    def _add_half_faces(self, hx, hy, hz, fside, size, ids, data):
+        model = self.model
+        if not len(hx):
+            return
+        bx = hx // 2 - self.x_origin
+        block_ids = ids[bx, hy // 2, hz // 2]
+        tex = self.tex[block_ids, data[bx, hy // 2, hz // 2], fside]
+        if model.greedy_merger is not None:
+            # the merger works in half blocks for this mode
+            for face in zip(hx.tolist(), hy.tolist(), hz.tolist(), fside.tolist(),
+                            tex[:, 0].tolist(), tex[:, 1].tolist(), block_ids.tolist()):
+                model.greedy_merger.add(*face)
+            return
+
+        corners = (np.stack((hx, hy, hz), axis=1)[:, np.newaxis, :] +
+                   np.array(SIDE_CORNERS)[fside] * size[:, np.newaxis, np.newaxis])
+        if model._stl_writer is not None:
+            half = corners.astype(np.float64) / 2.0
+            stl = np.stack(((half[:, :, 0] + model.xoffset) * model.stl_scale,
+                            -(half[:, :, 2] + model.zoffset) * model.stl_scale,
+                            half[:, :, 1] * model.stl_scale), axis=2)
+            model._check_min_max((tuple(stl.min(axis=(0, 1)).tolist()), tuple(stl.max(axis=(0, 1)).tolist())))
+            model._stl_writer.add_faces(stl.tolist())
+            return
+
+        vertex_indices = self._index_vertices(corners.reshape(-1, 3))
+
+        # full faces use the whole tile, quadrants the quarter of it
+        # _get_vt_index gives
+        quarter = np.stack((hx % 2, hy % 2, hz % 2), axis=1)
+        quad_x = np.zeros(len(hx), dtype=np.int64)
+        quad_y = np.zeros(len(hx), dtype=np.int64)
+        for side, ((flip_x, axis_x), (flip_y, axis_y)) in enumerate(SIDE_QUADS):
+            on_side = fside == side
+            quad_x[on_side] = quarter[on_side, axis_x] ^ flip_x
+            quad_y[on_side] = quarter[on_side, axis_y] ^ flip_y
+        tiles = (tex[:, 1] * 2 * 33) + (tex[:, 0] * 2)
+        quads = tiles + quad_y * 33 + quad_x
+        uv_indices = np.where((size == 2)[:, np.newaxis],
+                              tiles[:, np.newaxis] + np.array(TILE_CORNERS),
+                              quads[:, np.newaxis] + np.array(QUAD_CORNERS))
+
+        model.face_vertices.extend(vertex_indices.tolist())
+        model.face_uvs.extend(uv_indices.ravel().tolist())
+        model.face_sides.extend(fside.tolist())
+        model.face_blocks.extend(block_ids.tolist())
@@ -0,0 +1,101 @@
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+    ProcessPoolExecutor = None
+
+from blockmodel.constants import VERTEX_BITS
+from blockmodel.readers.region import RegionModelReader
+
+# slabs narrower than this cost more to send than to mesh
+MIN_SLAB_WIDTH = 8
+
+# stair corners look two blocks out so each slab takes that much either side
+SLAB_HALO = 2
+
+
+def _mesh_slab(job):
+    (model_class, blocks, data, origin, size, dimensions, x_start, x_stop,
+     mode, greedy, block_mapper, scales, offsets) = job
+    reader = RegionModelReader(blocks, data, origin, size, dimensions)
+    model = model_class(reader, mode=mode, greedy=greedy, block_mapper=block_mapper)
+    model.scale, model.stl_scale = scales
+    model.xoffset, model.yoffset, model.zoffset = offsets
+    visited = model._mesh_slab(x_start, x_stop)
+    groups = model.greedy_merger.groups if model.greedy_merger is not None else None
+    return (model.vertex_coords, model.face_vertices, model.face_uvs, model.face_sides,
+            model.face_blocks, model._volume, groups, visited)
+
+
+class ParallelMesher(object):
+    """
+    Meshes a BlockModel in slabs across x using a pool of processes.
+
+    Each slab is sent with the blocks either side of it so faces on its
+    edges come out as they would for the whole model. The results are merged
+    in slab order, numbering each slab's new vertices after the ones already
+    seen, which gives exactly the serial output.
+    """
+
+    def __init__(self, model, workers):
+        if ProcessPoolExecutor is None:
+            raise Exception("Meshing with workers needs concurrent.futures, install it with pip install futures")
+        self.model = model
+        self.workers = workers
+
+    def get_slabs(self):
+        width = self.model.width
+        count = self.workers * 2
+        slab_width = max(-(-width // count), MIN_SLAB_WIDTH)
+        return [(x, min(x + slab_width, width)) for x in range(0, width, slab_width)]
+
+    def _make_job(self, x_start, x_stop):
+        model = self.model
+        origin = (x_start - SLAB_HALO, 0, 0)
+        size = (x_stop - x_start + SLAB_HALO * 2, model.height, model.depth)
+        blocks, data = model.reader.get_region(*(origin + size))
+        # the shared mapper is made again in each process rather than sent
+        block_mapper = None if model.block_mapper is model.block_mapper.get_shared() else model.block_mapper
+        return (type(model), blocks, data, origin, size, (model.width, model.height, model.depth),
+                x_start, x_stop, model.mode, model.greedy, block_mapper,
+                (model.scale, model.stl_scale), (model.xoffset, model.yoffset, model.zoffset))
+
+    def mesh(self):
+        """
+        Meshes the model and returns the number of voxels visited.
+        """
+        slabs = self.get_slabs()
+        if len(slabs) < 2:
+            return self.model._mesh_slab(0, self.model.width)
+        visited = 0
+        jobs = [self._make_job(x_start, x_stop) for x_start, x_stop in slabs]
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for result in executor.map(_mesh_slab, jobs):
+                self._merge(*result[:-1])
+                visited += result[-1]
+        return visited
+
+    def _merge(self, vertex_coords, face_vertices, face_uvs, face_sides, face_blocks, volume, groups):
+        model = self.model
+        model._volume += volume
+        if groups is not None:
+            model.greedy_merger.update(groups)
+        if model._stl_writer is not None:
+            points = model._get_stl_vertices(vertex_coords)
+            model._check_min_max(points)
+            model._stl_writer.add_faces([points[i] for i in face_vertices[j:j + 4]] for j in range(0, len(face_vertices), 4))
+            return
+
+        remap = []
+        for i in range(0, len(vertex_coords), 3):
+            corner = vertex_coords[i:i + 3]
+            key = (corner[0] << VERTEX_BITS * 2) | (corner[1] << VERTEX_BITS) | corner[2]
+            index = model._vertices.get(key)
+            if index is None:
+                index = len(model._vertices)
+                model._vertices[key] = index
+                model.vertex_coords.extend(corner)
+            remap.append(index)
+        model.face_vertices.extend(remap[i] for i in face_vertices)
+        model.face_uvs.extend(face_uvs)
+        model.face_sides.extend(face_sides)
+        model.face_blocks.extend(face_blocks)
@@ -0,0 +1,202 @@
+import weakref
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from blockmodel.constants import *
+
+from blockmodel.mapper import TABLE_IDS, TABLE_DATA
+
+# tables made from each mapper, shared by the models using it
+MAPPER_TABLES = weakref.WeakKeyDictionary()
+
+# which of the mapper's top, side and bottom tiles each side uses
+SIDE_UVS = (0, 2, 1, 1, 1, 1)
+
+# offsets from the first texture vertex of a tile to each corner of a full face
+TILE_CORNERS = (66, 0, 2, 68)
+
+# blocks meshed at a time, the arrays for a chunk take a few tens of bytes
+# per block, and the fewest columns of x in a chunk however big the others
+CHUNK_BLOCKS = 1 << 20
+MIN_CHUNK_WIDTH = 4
+
+
+class VectorizedMesher(object):
+    """
+    Meshes a BlockModel with numpy.
+
+    Chunks of x are loaded into dense id and data arrays in turn and the
+    exposed faces of cube blocks are found with array shifts. Slabs and stairs, and
+    cubes that touch them, are handed back to the model's own per block
+    rendering so the output is identical to the default mode.
+    """
+
+    def __init__(self, model):
+        if np is None:
+            raise Exception("The vectorized mode needs numpy, install it with pip install numpy")
+        self.model = model
+        tables = MAPPER_TABLES.get(model.block_mapper)
+        if tables is None:
+            tables = MAPPER_TABLES[model.block_mapper] = self._make_tables(model.block_mapper)
+        self.kinds, self.tex = tables
+
+    def _make_tables(self, mapper):
+        # the mapper's table plus a last data column for out of range data
+        # values, which can still match a block by id alone
+        kinds = np.zeros((TABLE_IDS, TABLE_DATA + 1), dtype=np.uint8)
+        tex = np.zeros((TABLE_IDS, TABLE_DATA + 1, len(ALL_SIDES), 2), dtype=np.int32)
+        kinds[:, :TABLE_DATA] = np.frombuffer(mapper.block_types, dtype=np.uint8).reshape(TABLE_IDS, TABLE_DATA)
+        uvs = np.frombuffer(mapper.block_uvs, dtype=np.uint8).reshape(TABLE_IDS, TABLE_DATA, 3, 2)
+        tex[:, :TABLE_DATA] = uvs[:, :, SIDE_UVS]
+        for key, block in mapper.lu.items():
+            if not isinstance(key, tuple) and key < TABLE_IDS:
+                kinds[key, TABLE_DATA] = block.type_code
+                tex[key, TABLE_DATA] = block.tex_uvs
+        return kinds, tex
+
+    def _load_slab(self, x_start, x_stop, halo=1):
+        """
+        Returns ids and data in XYZ order from x_start - halo up to
+        x_stop + halo, with zeros outside the model.
+        """
+        model = self.model
+        views = model.reader.views()
+        if views is not None:
+            shape = (model.height, model.depth, model.width)
+            blocks = np.frombuffer(views[0], dtype=np.uint8).reshape(shape).transpose(2, 0, 1)
+            data = np.frombuffer(views[1], dtype=np.uint8).reshape(shape).transpose(2, 0, 1)
+            start = max(x_start - halo, 0)
+            stop = min(x_stop + halo, model.width)
+            pad = ((start - x_start + halo, x_stop + halo - stop), (0, 0), (0, 0))
+            blocks = np.pad(blocks[start:stop], pad, mode="constant")
+            data = np.pad(data[start:stop], pad, mode="constant")
+        else:
+            width = x_stop - x_start + halo * 2
+            blocks, data = model.reader.get_region(x_start - halo, 0, 0, width, model.height, model.depth)
+            # readers give YZX order, the mesher works in XYZ
+            shape = (model.height, model.depth, width)
+            blocks = np.frombuffer(blocks, dtype=np.uint16).reshape(shape).transpose(2, 0, 1)
+            data = np.frombuffer(data, dtype=np.uint8).reshape(shape).transpose(2, 0, 1)
+        return blocks, data
+
+    def _load_kinds(self, x_start, x_stop, halo):
+        """
+        Returns ids, data and TYPE_ codes for the slab, see _load_slab. Ids
+        the mapper has no table for are 0 and data values it has no table for
+        are TABLE_DATA.
+        """
+        ids, data = self._load_slab(x_start, x_stop, halo)
+        known = ids < TABLE_IDS
+        if not known.all():
+            ids = np.where(known, ids, 0)
+        data = np.minimum(data, TABLE_DATA)
+        kind = self.kinds[ids, data]
+        if not known.all():
+            kind[~known] = TYPE_NONE
+        return ids, data, kind
+
+    def mesh(self, x_start=0, x_stop=None):
+        """
+        Meshes the blocks from x_start up to x_stop, all of them by default,
+        a chunk at a time so the arrays never cover more than CHUNK_BLOCKS.
+        """
+        model = self.model
+        if x_stop is None:
+            x_stop = model.width
+        step = max(CHUNK_BLOCKS // max(model.height * model.depth, 1), MIN_CHUNK_WIDTH)
+        for chunk_start in range(x_start, x_stop, step):
+            self._mesh_chunk(chunk_start, min(chunk_start + step, x_stop))
+
+    def _mesh_chunk(self, x_start, x_stop):
+        model = self.model
+        self.x_origin = x_start - 1
+        ids, data, kind = self._load_kinds(x_start, x_stop, 1)
+
+        # the slab already has a block either side in x, pad y and z
+        padded = np.pad(kind, ((0, 0), (1, 1), (1, 1)), mode="constant")
+        kind = kind[1:-1]
+        cube = kind == TYPE_CUBE
+        exposed = np.zeros(kind.shape + (len(ALL_SIDES),), dtype=bool)
+        touches_partial = np.zeros(kind.shape, dtype=bool)
+        w, h, d = kind.shape
+        for side in ALL_SIDES:
+            dx, dy, dz = SIDE_NEIGHBOURS[side]
+            neighbour = padded[1 + dx:1 + dx + w, 1 + dy:1 + dy + h, 1 + dz:1 + dz + d]
+            exposed[:, :, :, side] = cube & (neighbour == TYPE_NONE)
+            touches_partial |= neighbour >= TYPE_HALFSLAB
+
+        # anything needing quadrant faces goes through the model's renderer
+        slow = (kind >= TYPE_HALFSLAB) | (cube & touches_partial)
+        exposed &= ~slow[:, :, :, np.newaxis]
+        model._volume += int(np.count_nonzero(cube & ~slow)) * model.stl_scale ** 3
+
+        fx, fy, fz, fside = np.nonzero(exposed)
+        face_keys = (fx * h + fy) * d + fz
+        fx += x_start
+        sx, sy, sz = np.nonzero(slow)
+        slow_keys = (sx * h + sy) * d + sz
+        sx += x_start
+
+        # interleave the bulk faces with the slow blocks in the default x, y, z order
+        splits = np.searchsorted(face_keys, slow_keys).tolist()
+        start = 0
+        for stop, x, y, z in zip(splits, sx.tolist(), sy.tolist(), sz.tolist()):
+            if stop > start:
+                self._add_faces(fx[start:stop], fy[start:stop], fz[start:stop], fside[start:stop], ids, data)
+                start = stop
+            model._render_block(model._get_block(x, y, z), x, y, z)
+        if len(fx) > start:
+            self._add_faces(fx[start:], fy[start:], fz[start:], fside[start:], ids, data)
+
+    def _add_faces(self, fx, fy, fz, fside, ids, data):
+        model = self.model
+        block_ids = ids[fx - self.x_origin, fy, fz]
+        tex = self.tex[block_ids, data[fx - self.x_origin, fy, fz], fside]
+        if model.greedy_merger is not None:
+            for face in zip(fx.tolist(), fy.tolist(), fz.tolist(), fside.tolist(),
+                            tex[:, 0].tolist(), tex[:, 1].tolist(), block_ids.tolist()):
+                model.greedy_merger.add(*face)
+            return
+
+        corners = np.stack((fx, fy, fz), axis=1)[:, np.newaxis, :] + np.array(SIDE_CORNERS)[fside]
+        if model._stl_writer is not None:
+            cx = corners[:, :, 0].astype(np.float64)
+            cy = corners[:, :, 1].astype(np.float64)
+            cz = corners[:, :, 2].astype(np.float64)
+            stl = np.stack(((cx + model.xoffset) * model.stl_scale,
+                            -(cz + model.zoffset) * model.stl_scale,
+                            cy * model.stl_scale), axis=2)
+            model._check_min_max((tuple(stl.min(axis=(0, 1)).tolist()), tuple(stl.max(axis=(0, 1)).tolist())))
+            model._stl_writer.add_faces(stl.tolist())
+            return
+
+        vertex_indices = self._index_vertices(corners.reshape(-1, 3) * 2)
+
+        # the same texture indices as _get_vt_index gives for a full face
+        tiles = (tex[:, 1] * 2 * 33) + (tex[:, 0] * 2)
+        uv_indices = tiles[:, np.newaxis] + np.array(TILE_CORNERS)
+
+        model.face_vertices.extend(vertex_indices.tolist())
+        model.face_uvs.extend(uv_indices.ravel().tolist())
+        model.face_sides.extend(fside.tolist())
+        model.face_blocks.extend(block_ids.tolist())
+
+    def _index_vertices(self, points):
+        model = self.model
+        vertices = model._vertices
+        keys = (points[:, 0] << VERTEX_BITS * 2) | (points[:, 1] << VERTEX_BITS) | points[:, 2]
+        unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        # number new vertices in the order they first appear, like _add_corners
+        order = np.argsort(first, kind="stable")
+        indices = np.empty(len(unique), dtype=np.int64)
+        for i, key, point in zip(order.tolist(), unique[order].tolist(), points[first[order]].tolist()):
+            index = vertices.get(key)
+            if index is None:
+                index = len(vertices)
+                vertices[key] = index
+                model.vertex_coords.extend(point)
+            indices[i] = index
+        return indices[inverse.reshape(-1)]
@@ -1,132 +1,192 @@
 import time
 import os
-from io import BytesIO
+import sys
+from itertools import chain, islice, repeat
+from array import array
+from io import BytesIO, StringIO, TextIOWrapper
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
+from collections import OrderedDict
 from jinja2 import Environment, PackageLoader
 from nbt import nbt
 
 from blockmodel.writers.stl_writer import Binary_STL_Writer
-from blockmodel.mapper import MinecraftBlockMapper
+from blockmodel.writers.glb_writer import make_glb
+from blockmodel.writers.ply_writer import make_ply
+from blockmodel.stats import CountingReader, NULL_TIMER
+from blockmodel.mapper import MinecraftBlockMapper, quadrant_bit, FULL_BLOCK
+from blockmodel.meshers import VectorizedMesher, HalfGridMesher, GreedyMerger, ParallelMesher
 from blockmodel.readers import *
 from blockmodel.constants import *
-from blockmodel.writers.file_writers import write_stl, write_x3d, write_collada, write_obj, write_csv
+from blockmodel.writers.file_writers import write_stl_stream, write_x3d_stream, write_collada_stream, write_obj_stream, write_glb, write_ply, write_3mf_stream, write_csv
 
 THIS_DIR = os.path.dirname(__file__)
 RESOURCES_ROOT = os.path.join(os.path.dirname(__file__), "resources")
 
 jinja_env = Environment(loader=PackageLoader('blockmodel.model', 'templates'))
 
+# total size in bytes or characters of rendered outputs each model keeps
+OUTPUT_CACHE_LIMIT = 64 * 1024 * 1024
+
+# lines written at a time when streaming text outputs
+STREAM_LINES = 4096
+
+# the parts of a 3MF package and the templates they are made from, the
+# parts are dated so the same model always makes the same package
+THREEMF_MODEL = "3D/3dmodel.model"
+THREEMF_PARTS = (("[Content_Types].xml", "3mf_content_types.xml"),
+                 ("_rels/.rels", "3mf_rels.xml"),
+                 (THREEMF_MODEL, "3mf_model.xml"))
+THREEMF_DATE = (1980, 1, 1, 0, 0, 0)
+
+
+# the texture coordinates are the same for every model
+TEX_UV_MAPPINGS = [(x/32.0, y/32.0) for y in range(33) for x in range(33)]
+OBJ_UV_MAPPINGS = "\n".join(["vt %.5f %.5f" % uv for uv in TEX_UV_MAPPINGS])
+
+# the offsets of a block's quadrants and their occupancy bits
+QUADRANTS = [(xd, yd, zd, quadrant_bit(int(xd * 2), int(yd * 2), int(zd * 2)))
+             for xd in (0.0, 0.5) for yd in (0.0, 0.5) for zd in (0.0, 0.5)]
+
+
+def _make_quadrant_faces():
+    # for each side and quadrant, whether the quadrant it faces is in the
+    # neighbouring block and that quadrant's bit
+    faces = []
+    for dx, dy, dz in SIDE_NEIGHBOURS:
+        side_faces = []
+        for xx in (0, 1):
+            for yy in (0, 1):
+                for zz in (0, 1):
+                    other = (xx + dx, yy + dy, zz + dz)
+                    outside = any(c < 0 or c > 1 for c in other)
+                    side_faces.append((outside, quadrant_bit(*[c % 2 for c in other])))
+        faces.append(side_faces)
+    return faces
+
+
+QUADRANT_FACES = _make_quadrant_faces()
+
+
+def _mesh_attribute(name, ensure):
+    # a read only view of what meshing found, meshing first if need be
+    def get(self):
+        getattr(self, ensure)()
+        return getattr(self, name)
+    return property(get)
+
+
+class _CachedOutput(property):
+    # a property kept in the model's output cache under key
+
+    def __init__(self, key, make):
+        property.__init__(self, lambda model: model._get_output(key, make))
+        self.key = key
+
+
+def _join_chunks(items, separator=u" "):
+    # the items joined by separator, STREAM_LINES of them at a time
+    items = iter(items)
+    before = u""
+    while True:
+        batch = list(islice(items, STREAM_LINES))
+        if not batch:
+            return
+        yield before + separator.join(batch)
+        before = separator
+
+
+def _write_template(fileobj, name, attrs):
+    for chunk in jinja_env.get_template(name).generate(attrs):
+        fileobj.write(chunk)
+
+
 class BlockModel(object):
     
-    def __init__(self, reader):
-        self.vertices = {}
-        self.faces = []
-        self.texUvMappingsArray = []
-        self.volume = 0
-        self.surface = 0
-        lines = []
-        for y in range(33):
-            for x in range(33):
-                lines.append("vt %.5f %.5f" % (x/32.0, y/32.0))
-                self.texUvMappingsArray.append((x/32.0, y/32.0))
-        self.uv_mappings = "\n".join(lines)
+    def __init__(self, reader, mode=MODE_DEFAULT, greedy=None, cache_limit=OUTPUT_CACHE_LIMIT, block_mapper=None, workers=None, stats=None):
+        if mode not in MODES:
+            raise Exception("Unrecognised mode %s" % mode)
+        if greedy not in GREEDY_MODES:
+            raise Exception("Unrecognised greedy mode %s" % greedy)
+        if workers is not None and workers < 1:
+            raise Exception("Need at least one worker, got %s" % workers)
+        self.mode = mode
+        self.greedy = greedy
+        self.workers = workers
+        self.stats = stats
+        self.cache_limit = cache_limit
+        self.texUvMappingsArray = TEX_UV_MAPPINGS
+        self.uv_mappings = OBJ_UV_MAPPINGS
         self.reader = reader
         self.timestamp = time.strftime("%Y-%m-%dT%H:%M:%S.000000", time.gmtime())
         self.width = self.reader.width
         self.height = self.reader.height
         self.depth = self.reader.depth
-        self.max_x = None
-        self.min_x = None
-        self.max_y = None
-        self.min_y = None
-        self.max_z = None
-        self.min_z = None
         self.scale = 2
         self.stl_scale = 2.0
         self.xoffset = -self.width/2.0
         self.yoffset = 0
         self.zoffset = -self.depth/2.0
-        self.faces = []
-        self.stl_faces = []
-        self.block_mapper = MinecraftBlockMapper()
-        self._process()
-        self._make_stl()
+        self.block_mapper = block_mapper or MinecraftBlockMapper.get_shared()
+        self._outputs = OrderedDict()
+        self._outputs_size = 0
+        self._stl_writer = None
+        self._reset_mesh()
+
+    def _reset_mesh(self):
+        # meshing is done on first use, see _ensure_mesh
+        self._meshed = False
+        # packed vertex key to index, with the doubled coordinates of each
+        # index in vertex_coords, see _get_ordered_vertices
+        self._vertices = {}
+        self.vertex_coords = array("i")
+        # four vertex and four texture coordinate indices per face counted
+        # from 0, and each face's side and block id
+        self.face_vertices = array("i")
+        self.face_uvs = array("i")
+        self.face_sides = array("B")
+        self.face_blocks = array("H")
+        self._volume = 0
+        self.surface = 0
+        self._max_x = None
+        self._min_x = None
+        self._max_y = None
+        self._min_y = None
+        self._max_z = None
+        self._min_z = None
+        if self.greedy:
+            # the half grid mode merges quadrant faces, measured in half blocks
+            unit = 0.5 if self.mode == MODE_HALF_GRID else 1
+            self.greedy_merger = GreedyMerger(self.greedy == GREEDY_ALL, unit)
+        else:
+            self.greedy_merger = None
 
     @classmethod
-    def from_json(cls, as_json, max_size=None):
-        return cls(JsonModelReader(as_json, max_size))
+    def _from_reader(cls, reader_class, source, max_size, kwargs):
+        stats = kwargs.get("stats")
+        with stats.time("read") if stats is not None else NULL_TIMER:
+            reader = reader_class(source, max_size)
+        return cls(reader, **kwargs)
+
+    @classmethod
+    def from_json(cls, as_json, max_size=None, **kwargs):
+        return cls._from_reader(JsonModelReader, as_json, max_size, kwargs)
     
     @classmethod
-    def from_png(cls, as_png, max_size=None):
-        return cls(PngModelReader(as_png, max_size))
+    def from_png(cls, as_png, max_size=None, **kwargs):
+        return cls._from_reader(PngModelReader, as_png, max_size, kwargs)
     
     @classmethod
-    def from_sparse_json(cls, as_json, max_size=None):
-        return cls(SparseJsonModelReader(as_json, max_size))
+    def from_sparse_json(cls, as_json, max_size=None, **kwargs):
+        return cls._from_reader(SparseJsonModelReader, as_json, max_size, kwargs)
         
     @classmethod
-    def from_schematic_file(cls, schematic, max_size=None):
-        return cls(SchematicModelReader(schematic, max_size))
-
-    def _is_blank_quadrant(self, x, y, z, xd, yd, zd, side):
-        
-        q = 0.5
-        x1 = x
-        y1 = y
-        z1 = z
-        xd1 = xd
-        yd1 = yd
-        zd1 = zd
+    def from_schematic_file(cls, schematic, max_size=None, mapped=False, **kwargs):
+        if mapped:
+            return cls._from_reader(MappedSchematicModelReader, schematic, max_size, kwargs)
+        return cls._from_reader(SchematicModelReader, schematic, max_size, kwargs)
 
-        if side == SIDE_TOP:
-            if y + yd == self.height - q:
-                return True
-            if yd == 0.0:
-                yd1 = 0.5
-            if yd == 0.5:
-                yd1 = 0.0
-                y1 = y + 1
-        if side == SIDE_BOTTOM:
-            if y + yd == 0:
-                return True
-            if yd == 0.0:
-                yd1 = 0.5
-                y1 = y - 1
-            if yd == 0.5:
-                yd1 = 0.0
-        if side == SIDE_RIGHT:
-            if x + xd == self.width - q:
-                return True
-            if xd == 0.0:
-                xd1 = 0.5
-            if xd == 0.5:
-                xd1 = 0.0
-                x1 = x + 1
-        if side == SIDE_LEFT:
-            if x + xd == 0:
-                return True
-            if xd == 0.0:
-                x1 = x - 1
-                xd1 = 0.5
-            if xd == 0.5:
-                xd1 = 0.0
-        if side == SIDE_FRONT:
-            if z + zd == self.depth - q:
-                return True
-            if zd == 0.0:
-                zd1 = 0.5
-            if zd == 0.5:
-                zd1 = 0.0
-                z1 = z + 1
-        if side == SIDE_BACK:
-            if z + zd == 0:
-                return True
-            if zd == 0.0:
-                zd1 = 0.5
-                z1 = z - 1
-            if zd == 0.5:
-                zd1 = 0.0
-                
-        return self.block_mapper.is_blank(x1, y1, z1, xd1, yd1, zd1, self.reader)
+    def _time(self, stage):
+        return self.stats.time(stage) if self.stats is not None else NULL_TIMER
 
     def _render_partial_face(self, block, x, y, z, side):
         
@@ -216,10 +276,11 @@ class BlockModel(object):
             yd4 = 0.5
             zd4 = 0.0
 
-        self._render_face_quadrant(block, x, y, z, xd1, yd1, zd1, side, d)
-        self._render_face_quadrant(block, x, y, z, xd2, yd2, zd2, side, d)
-        self._render_face_quadrant(block, x, y, z, xd3, yd3, zd3, side, d)
-        self._render_face_quadrant(block, x, y, z, xd4, yd4, zd4, side, d)
+        neighbour = self._get_neighbour_quadrants(x, y, z, side)
+        self._render_face_quadrant(block, x, y, z, xd1, yd1, zd1, side, d, FULL_BLOCK, neighbour)
+        self._render_face_quadrant(block, x, y, z, xd2, yd2, zd2, side, d, FULL_BLOCK, neighbour)
+        self._render_face_quadrant(block, x, y, z, xd3, yd3, zd3, side, d, FULL_BLOCK, neighbour)
+        self._render_face_quadrant(block, x, y, z, xd4, yd4, zd4, side, d, FULL_BLOCK, neighbour)
 
     def _renderface(self, block, x, y, z, side):
         
@@ -240,7 +301,11 @@ class BlockModel(object):
 
         if block.block_type == "cube":
             if other_block is None:
-                self._add_face(self._get_face_corners(x, y, z, side), block, side)
+                if self.greedy_merger is not None:
+                    tex_x, tex_y = self.block_mapper.get_tex_uv(block, side)
+                    self.greedy_merger.add(x, y, z, side, tex_x, tex_y, block.block_id)
+                else:
+                    self._add_face(self._get_face_corners(x, y, z, side), block, side)
             else:
                 if other_block.block_type != "cube":
                     self._render_partial_face(block, x, y, z, side)
@@ -268,14 +333,14 @@ class BlockModel(object):
     def _render_block(self, block, x, y, z):
         block_volume = self.stl_scale ** 3
         if block.block_type == "cube":
-            self.volume += block_volume
+            self._volume += block_volume
             for side in ALL_SIDES:
                 self._renderface(block, x, y, z, side)
         else:
             if block.block_type == "halfslab":
-                self.volume += block_volume/2.0
+                self._volume += block_volume/2.0
             if block.block_type == "stair":
-                self.volume += (block_volume * 3.0)/4.0
+                self._volume += (block_volume * 3.0)/4.0
             self._render_block_sub_blocks(block, x, y, z)
 
     def _get_quadrant_corners_quads(self, x, y, z, xd, yd, zd, side, d):
@@ -334,139 +399,441 @@ class BlockModel(object):
         return (A, B, C, D), quad_x, quad_y
     
 
-    def _render_face_quadrant(self, block, x, y, z, xd, yd, zd, side, d):
-        if not self._is_blank_quadrant(x, y, z, xd, yd, zd, side):
+    def _get_neighbour_quadrants(self, x, y, z, side):
+        dx, dy, dz = SIDE_NEIGHBOURS[side]
+        return self.block_mapper.get_quadrants(x + dx, y + dy, z + dz, self.reader)
+
+    def _render_face_quadrant(self, block, x, y, z, xd, yd, zd, side, d, quadrants, neighbour):
+        # quadrants and neighbour are the occupancy masks of this block and
+        # the one next to it on this side
+        outside, bit = QUADRANT_FACES[side][(int(xd * 2) << 2) | (int(yd * 2) << 1) | int(zd * 2)]
+        if (neighbour if outside else quadrants) & bit:
             return
         corners, quad_x, quad_y = self._get_quadrant_corners_quads(x, y, z, xd, yd, zd, side, d)
         self._add_face(corners, block, side, quad_x, quad_y)
 
     def _render_block_sub_blocks(self, block, x, y, z):
         d = 0.5
-        for xd in (0.0, d):
-            for yd in (0.0, d):
-                for zd in (0.0, d):
-                    if self.block_mapper.is_blank(x, y, z, xd, yd, zd, self.reader):
-                        continue
-                    for side in ALL_SIDES:
-                        self._render_face_quadrant(block, x, y, z, xd, yd, zd, side, d)
+        quadrants = self.block_mapper.get_quadrants(x, y, z, self.reader)
+        neighbours = [self._get_neighbour_quadrants(x, y, z, side) for side in ALL_SIDES]
+        for xd, yd, zd, bit in QUADRANTS:
+            if quadrants & bit:
+                for side in ALL_SIDES:
+                    self._render_face_quadrant(block, x, y, z, xd, yd, zd, side, d, quadrants, neighbours[side])
 
     def _check_min_max(self, points):
         for p in points:
             x, y, z = p
-            if self.max_x is None or x > self.max_x:
-                self.max_x = x
-            if self.min_x is None or x < self.min_x:
-                self.min_x = x
-            if self.max_y is None or y > self.max_y:
-                self.max_y = y
-            if self.min_y is None or y < self.min_y:
-                self.min_y = y
-            if self.max_z is None or z > self.max_z:
-                self.max_z = z
-            if self.min_z is None or z < self.min_z:
-                self.min_z = z
+            if self._max_x is None or x > self._max_x:
+                self._max_x = x
+            if self._min_x is None or x < self._min_x:
+                self._min_x = x
+            if self._max_y is None or y > self._max_y:
+                self._max_y = y
+            if self._min_y is None or y < self._min_y:
+                self._min_y = y
+            if self._max_z is None or z > self._max_z:
+                self._max_z = z
+            if self._min_z is None or z < self._min_z:
+                self._min_z = z
 
 
     def _add_face(self, corners, block, side, quad_x=None, quad_y=None):
+        tex_x, tex_y = self.block_mapper.get_tex_uv(block, side)
+        self._add_textured_face(corners, tex_x, tex_y, side, quad_x, quad_y, block.block_id)
 
-        scaled_stl = [((c[0] + self.xoffset) * self.stl_scale, -(c[2] + self.zoffset) * self.stl_scale, c[1] * self.stl_scale) for c in corners]
-        # self.surface += poly_area(scaled_stl)
-        self._check_min_max(scaled_stl)
+    def _add_textured_face(self, corners, tex_x, tex_y, side, quad_x=None, quad_y=None, block_id=0):
 
-        scaled_obj = [((c[0] + self.xoffset) * self.scale, c[1] * self.scale, (c[2] + self.zoffset) * self.scale) for c in corners] 
-        tex_x, tex_y = self.block_mapper.get_tex_uv(block, side)
-        self._add_corners(scaled_obj, tex_x, tex_y, quad_x, quad_y)
-        self.stl_faces.append(scaled_stl)
+        if self._stl_writer is not None:
+            # streaming, see stream_stl
+            scaled_stl = [((c[0] + self.xoffset) * self.stl_scale, -(c[2] + self.zoffset) * self.stl_scale, c[1] * self.stl_scale) for c in corners]
+            self._check_min_max(scaled_stl)
+            self._stl_writer.add_face(scaled_stl)
+            return
+
+        self._add_corners([(int(c[0] * 2), int(c[1] * 2), int(c[2] * 2)) for c in corners], tex_x, tex_y, quad_x, quad_y)
+        self.face_sides.append(side)
+        self.face_blocks.append(block_id)
         
+    def _mesh_slab(self, x_start, x_stop):
+        """
+        Meshes the blocks from x_start up to x_stop and returns the number of
+        voxels visited.
+        """
+        if self.mode == MODE_VECTORIZED:
+            VectorizedMesher(self).mesh(x_start, x_stop)
+            return max(x_stop - x_start, 0) * self.height * self.depth
+        if self.mode == MODE_HALF_GRID:
+            HalfGridMesher(self).mesh(x_start, x_stop)
+            return max(x_stop - x_start, 0) * self.height * self.depth
+        visited = 0
+        for x, y, z in self.reader.occupied(x_start, x_stop):
+            visited += 1
+            block = self._get_block(x, y, z)
+            if block is not None:
+                self._render_block(block, x, y, z)
+        return visited
+
     def _process(self):
-        for x in range(self.width):
-            for y in range(self.height):
-                for z in range(self.depth):
-                    block = self._get_block(x, y, z)
-                    if block is not None:
-                        self._render_block(block, x, y, z)
+        if self.stats is None:
+            self._mesh()
+            return
+        reader = self.reader
+        self.reader = CountingReader(reader)
+        try:
+            with self.stats.time("process"):
+                visited = self._mesh()
+            self.stats.count("reader_gets", self.reader.gets)
+        finally:
+            self.reader = reader
+        self.stats.count("voxels_visited", visited)
+        if self._stl_writer is not None:
+            self.stats.count("faces", self._stl_writer.counter // 2)
+        else:
+            self.stats.count("faces", self.face_count)
+            self.stats.count("vertices", len(self._vertices))
+            self.stats.count("vertices_deduplicated", len(self.face_vertices) - len(self._vertices))
+
+    def _mesh(self):
+        if self.workers is not None and self.workers > 1:
+            visited = ParallelMesher(self, self.workers).mesh()
+        else:
+            visited = self._mesh_slab(0, self.width)
+        if self.greedy_merger is not None:
+            self.greedy_merger.add_to(self)
+        if self._stl_writer is None:
+            self._check_min_max(self._get_stl_vertices())
+        return visited
+
+    def _ensure_mesh(self):
+        if not self._meshed:
+            self._process()
+            self._meshed = True
 
     def _make_stl(self):
+        self._ensure_mesh()
         output = BytesIO()
-        stlwriter = Binary_STL_Writer(output)
-        stlwriter.add_faces(self.stl_faces)
-        stlwriter.close()
+        self._write_stl(output)
         stl = output.getvalue()
         output.close()
-        self.stl = stl
+        return stl
+
+    def stream_stl(self, fileobj):
+        """
+        Writes the model to fileobj as binary STL.
+
+        If the model has not been meshed yet its triangles are written as they
+        are made and not kept, so fileobj must be seekable for the triangle
+        count to be filled in at the end. Once meshed the count is known up
+        front and any writable file object will do.
+        """
+        with self._time("stream_stl"):
+            self._write_stl(fileobj)
+
+    def _write_stl(self, fileobj):
+        stl = self._outputs.get("stl")
+        if stl is not None:
+            fileobj.write(stl)
+        elif self._meshed:
+            stlwriter = Binary_STL_Writer(fileobj, self.face_count * 2)
+            stlwriter.add_faces(self._get_stl_faces())
+            stlwriter.close()
+        else:
+            stlwriter = Binary_STL_Writer(fileobj)
+            self._stl_writer = stlwriter
+            try:
+                self._process()
+                bounds, volume = self._get_bounds(), self._volume
+            finally:
+                # no faces were kept so mesh again on next use
+                self._stl_writer = None
+                self._reset_mesh()
+            self._set_bounds(bounds)
+            self._volume = volume
+            stlwriter.close()
+
+    def _get_output(self, name, make):
+        output = self._outputs.pop(name, None)
+        if output is None:
+            with self._time(name):
+                output = make(self)
+            size = len(output)
+            if self.stats is not None:
+                self.stats.count("bytes_%s" % name, size)
+            if size > self.cache_limit:
+                return output
+            self._outputs_size += size
+            # evict the least recently used outputs to stay under the limit
+            while self._outputs_size > self.cache_limit:
+                _, evicted = self._outputs.popitem(last=False)
+                self._outputs_size -= len(evicted)
+        self._outputs[name] = output
+        return output
+
+    def invalidate(self, *names):
+        """
+        Drops cached outputs so they are rendered again on next use.
+
+        With no names every output and the mesh itself are dropped, use this
+        after changing the reader or any of the model's settings. Names are
+        those of the output properties, such as obj or x3d_triangles.
+        """
+        if not names:
+            self._outputs.clear()
+            self._outputs_size = 0
+            self._reset_mesh()
+            return
+        keys = []
+        for name in names:
+            output = getattr(type(self), name, None)
+            if not isinstance(output, _CachedOutput):
+                raise Exception("Unrecognised output %s" % name)
+            keys.append(output.key)
+        for key in keys:
+            output = self._outputs.pop(key, None)
+            if output is not None:
+                self._outputs_size -= len(output)
+
+    @property
+    def face_count(self):
+        return len(self.face_sides)
+
+    @property
+    def faces(self):
+        """
+        The faces as lists of vertex and texture coordinate index pairs
+        counted from 1, as in OBJ files.
+        """
+        self._ensure_mesh()
+        return [list(f) for f in self._get_face_indices(1)]
+
+    def _get_face_indices(self, base=0):
+        fv = self.face_vertices
+        fu = self.face_uvs
+        for i in range(0, len(fv), 4):
+            yield (fv[i] + base, fu[i] + base, fv[i + 1] + base, fu[i + 1] + base,
+                   fv[i + 2] + base, fu[i + 2] + base, fv[i + 3] + base, fu[i + 3] + base)
+
+    def _get_stl_vertices(self, coords=None):
+        if coords is None:
+            coords = self.vertex_coords
+        return [((coords[i] / 2.0 + self.xoffset) * self.stl_scale,
+                 -(coords[i + 2] / 2.0 + self.zoffset) * self.stl_scale,
+                 coords[i + 1] / 2.0 * self.stl_scale) for i in range(0, len(coords), 3)]
+
+    def _get_stl_faces(self):
+        points = self._get_stl_vertices()
+        fv = self.face_vertices
+        return ([points[fv[i]], points[fv[i + 1]], points[fv[i + 2]], points[fv[i + 3]]] for i in range(0, len(fv), 4))
 
-    def _get_ordered_vertices(self):
-        ordered_vertices = [None] * len(self.vertices)
-        for k, v in self.vertices.items():
-            ordered_vertices[v] = k
-        return ordered_vertices
+    def _get_vertex_points(self):
+        for start in range(0, len(self._vertices), STREAM_LINES):
+            for v in self._get_ordered_vertices(start, start + STREAM_LINES):
+                yield u"%.5g %.5g %.5g" % v
+
+    def _get_ordered_vertices(self, start=0, stop=None):
+        coords = self.vertex_coords
+        stop = len(self._vertices) if stop is None else min(stop, len(self._vertices))
+        return [((coords[i] / 2.0 + self.xoffset) * self.scale,
+                 coords[i + 1] / 2.0 * self.scale,
+                 (coords[i + 2] / 2.0 + self.zoffset) * self.scale) for i in range(start * 3, stop * 3, 3)]
 
     def _as_x3d_faces(self):
+        return self._render_to_string(self._write_x3d_faces)
+
+    def _write_x3d_faces(self, fileobj):
+        self._ensure_mesh()
+        fv = self.face_vertices
+        fu = self.face_uvs
         attrs = {}
-        ordered_vertices = self._get_ordered_vertices()
-        vertex_lines = ["%.5g %.5g %.5g" % v for v in ordered_vertices]
-        coord_index = ["%i %i %i %i %i %i %i %i" % (f[0] - 1, f[2] - 1, f[4] - 1, -1, f[0] - 1, f[4] - 1, f[6] - 1, -1) for f in self.faces]
-        tex_coord_index =  ["%i %i %i %i %i %i %i %i" % (f[1] - 1, f[3] - 1, f[5] - 1, -1, f[1] - 1, f[5] - 1, f[7] - 1, -1) for f in self.faces]
-        attrs["coordinate_point"] = " ".join(vertex_lines)
-        attrs["coord_index"] = " ".join(coord_index)
-        attrs["tex_coord_index"] = " ".join(tex_coord_index)
+        attrs["coordinate_point"] = _join_chunks(self._get_vertex_points())
+        attrs["coord_index"] = _join_chunks(u"%i %i %i %i %i %i %i %i" % (fv[i], fv[i + 1], fv[i + 2], -1, fv[i], fv[i + 2], fv[i + 3], -1) for i in range(0, len(fv), 4))
+        attrs["tex_coord_index"] = _join_chunks(u"%i %i %i %i %i %i %i %i" % (fu[i], fu[i + 1], fu[i + 2], -1, fu[i], fu[i + 2], fu[i + 3], -1) for i in range(0, len(fu), 4))
         attrs["timestamp"] = self.timestamp
-        template = jinja_env.get_template("x3d_faces.xml")
-        as_x3d = template.render(attrs)
-        return str(as_x3d)
-    
+        _write_template(fileobj, "x3d_faces.xml", attrs)
+
     def _as_x3d_triangles(self):
-        attrs = {}
-        ov = self._get_ordered_vertices()
-        tx = self.texUvMappingsArray
+        return self._render_to_string(self._write_x3d_triangles)
 
+    def _write_x3d_triangles(self, fileobj):
+        self._ensure_mesh()
         # each face is a pair of triangles
-        index = [str(i) for i in range(len(self.faces) * 6)]
-        
-        all_the_coord_points = []
-        all_the_tex_coord_points = []
-        
-        for f in self.faces:
-            all_the_coord_points.append(ov[f[0] - 1])
-            all_the_coord_points.append(ov[f[2] - 1])
-            all_the_coord_points.append(ov[f[4] - 1])
-            all_the_coord_points.append(ov[f[0] - 1])
-            all_the_coord_points.append(ov[f[4] - 1])
-            all_the_coord_points.append(ov[f[6] - 1])
-            
-            all_the_tex_coord_points.append(tx[f[1] - 1])
-            all_the_tex_coord_points.append(tx[f[3] - 1])
-            all_the_tex_coord_points.append(tx[f[5] - 1])
-            all_the_tex_coord_points.append(tx[f[1] - 1])
-            all_the_tex_coord_points.append(tx[f[5] - 1])
-            all_the_tex_coord_points.append(tx[f[7] - 1])
-            
-        coord_points = ["%.5g %.5g %.5g" % cp for cp in all_the_coord_points]
-        tex_coord_points = ["%.5g %.5g" % tp for tp in all_the_tex_coord_points]
+        points = list(self._get_vertex_points())
+        tex_points = [u"%.5g %.5g" % tp for tp in self.texUvMappingsArray]
+        fv = self.face_vertices
+        fu = self.face_uvs
+        attrs = {}
+        attrs["index"] = _join_chunks(u"%i" % i for i in range(self.face_count * 6))
+        attrs["coordinate_point"] = _join_chunks(u" ".join((points[fv[i]], points[fv[i + 1]], points[fv[i + 2]],
+                                                            points[fv[i]], points[fv[i + 2]], points[fv[i + 3]]))
+                                                 for i in range(0, len(fv), 4))
+        attrs["tex_coord_point"] = _join_chunks(u" ".join((tex_points[fu[i]], tex_points[fu[i + 1]], tex_points[fu[i + 2]],
+                                                           tex_points[fu[i]], tex_points[fu[i + 2]], tex_points[fu[i + 3]]))
+                                                for i in range(0, len(fu), 4))
+        attrs["timestamp"] = self.timestamp
+        _write_template(fileobj, "x3d_triangles.xml", attrs)
 
-        attrs["coordinate_point"] = " ".join(coord_points)
-        attrs["index"] = " ".join(index)
-        attrs["tex_coord_point"] = " ".join(tex_coord_points)
+    def _as_x3d_indexed(self):
+        return self._render_to_string(self._write_x3d_indexed)
+
+    def _write_x3d_indexed(self, fileobj):
+        self._ensure_mesh()
+        vertex_indices, uv_indices, corners = self._get_uv_vertices()
+        points = list(self._get_vertex_points())
+        tex_points = [u"%.5g %.5g" % tp for tp in self.texUvMappingsArray]
+        attrs = {}
+        attrs["index"] = _join_chunks(u"%i %i %i %i %i %i" % (corners[i], corners[i + 1], corners[i + 2],
+                                                               corners[i], corners[i + 2], corners[i + 3])
+                                      for i in range(0, len(corners), 4))
+        attrs["coordinate_point"] = _join_chunks(points[i] for i in vertex_indices)
+        attrs["tex_coord_point"] = _join_chunks(tex_points[i] for i in uv_indices)
         attrs["timestamp"] = self.timestamp
-        template = jinja_env.get_template("x3d_triangles.xml")
-        as_x3d = template.render(attrs)
-        return str(as_x3d)
+        _write_template(fileobj, "x3d_triangles.xml", attrs)
+
+    def _get_uv_vertices(self, split_sides=False):
+        """
+        Returns the distinct vertex and texture coordinate pairs used by the
+        faces, as arrays of vertex indices and texture coordinate indices in
+        the order they are first used, and the faces' corners as indices into
+        them, four per face. With split_sides corners on different sides are
+        kept apart too, so each can have its side's normal, and an array of
+        their sides is returned as well.
+        """
+        uv_count = len(self.texUvMappingsArray)
+        side_count = len(ALL_SIDES) if split_sides else 1
+        sides = self.face_sides
+        corner_sides = chain.from_iterable(zip(sides, sides, sides, sides)) if split_sides else repeat(0)
+        pairs = {}
+        corners = array("i", [pairs.setdefault((v * uv_count + uv) * side_count + side, len(pairs))
+                              for v, uv, side in zip(self.face_vertices, self.face_uvs, corner_sides)])
+        ordered = [0] * len(pairs)
+        for key, i in pairs.items():
+            ordered[i] = key
+        vertex_indices = array("i", [key // side_count // uv_count for key in ordered])
+        uv_indices = array("i", [key // side_count % uv_count for key in ordered])
+        if split_sides:
+            return vertex_indices, uv_indices, corners, array("B", [key % side_count for key in ordered])
+        return vertex_indices, uv_indices, corners
+
+    def _get_triangle_corners(self, corners):
+        # each face is a pair of triangles
+        first, second, third, fourth = corners[0::4], corners[1::4], corners[2::4], corners[3::4]
+        return chain.from_iterable(zip(first, second, third, first, third, fourth))
+
+    def _as_glb(self):
+        self._ensure_mesh()
+        vertex_indices, uv_indices, corners, sides = self._get_uv_vertices(split_sides=True)
+        ordered_vertices = self._get_ordered_vertices()
+        # glTF has v running down the texture
+        tex = [(u, 1.0 - v) for u, v in self.texUvMappingsArray]
+        positions = array("f", list(chain.from_iterable(map(ordered_vertices.__getitem__, vertex_indices))))
+        uvs = array("f", list(chain.from_iterable(map(tex.__getitem__, uv_indices))))
+        normals = array("f", list(chain.from_iterable(map(SIDE_NEIGHBOURS.__getitem__, sides))))
+        indices = array("I", list(self._get_triangle_corners(corners)))
+        with open(os.path.join(RESOURCES_ROOT, "terrain_big.png"), "rb") as f:
+            png = f.read()
+        return make_glb(positions, normals, uvs, indices, png)
+
+    def _as_ply(self, block_ids=False):
+        self._ensure_mesh()
+        vertex_indices, uv_indices, corners = self._get_uv_vertices()
+        ordered_vertices = self._get_ordered_vertices()
+        tex = self.texUvMappingsArray
+        vertices = array("f", list(chain.from_iterable(map(tuple.__add__, map(ordered_vertices.__getitem__, vertex_indices),
+                                                           map(tex.__getitem__, uv_indices)))))
+        return make_ply(vertices, corners, self.face_blocks if block_ids else None)
+
+    def _as_ply_blocks(self):
+        return self._as_ply(block_ids=True)
+
+    def _as_3mf(self):
+        output = BytesIO()
+        self._write_3mf(output)
+        as_3mf = output.getvalue()
+        output.close()
+        return as_3mf
+
+    def _write_3mf(self, fileobj):
+        self._ensure_mesh()
+        # a material for each texture tile used, found from the lowest
+        # texture coordinate of each face
+        fu = self.face_uvs
+        materials = {}
+        face_materials = [materials.setdefault((low % 33 // 2, low // 66), len(materials))
+                          for low in map(min, fu[0::4], fu[1::4], fu[2::4], fu[3::4])]
+        mapper = self.block_mapper
+        attrs = {}
+        attrs["materials"] = [(mapper.get_tile_name(*tile), mapper.get_tile_colour(*tile))
+                              for tile in sorted(materials, key=materials.get)]
+        attrs["vertices"] = _join_chunks((u'     <vertex x="%.9g" y="%.9g" z="%.9g"/>' % v for v in self._get_stl_vertices()), u"\n")
+        fv = self.face_vertices
+        first, second, third, fourth = fv[0::4], fv[1::4], fv[2::4], fv[3::4]
+        triangles = chain.from_iterable(zip(zip(first, second, third, face_materials), zip(first, third, fourth, face_materials)))
+        attrs["triangles"] = _join_chunks((u'     <triangle v1="%i" v2="%i" v3="%i" p1="%i"/>' % t for t in triangles), u"\n")
+
+        with ZipFile(fileobj, "w", ZIP_DEFLATED) as package:
+            for name, template in THREEMF_PARTS:
+                part = ZipInfo(name, THREEMF_DATE)
+                part.compress_type = ZIP_DEFLATED
+                if name != THREEMF_MODEL:
+                    package.writestr(part, jinja_env.get_template(template).render().encode("utf-8"))
+                elif sys.version_info < (3, 6):
+                    # zip entries can only be opened for writing from 3.6
+                    package.writestr(part, jinja_env.get_template(template).render(attrs).encode("utf-8"))
+                else:
+                    # the model is written to the zip as it is rendered
+                    with package.open(part, "w") as entry:
+                        text = TextIOWrapper(entry, encoding="utf-8")
+                        _write_template(text, template, attrs)
+                        text.flush()
+                        text.detach()
+
+    def stream_3mf(self, fileobj):
+        """
+        Writes the model to fileobj, opened for binary, as a 3MF package.
+
+        There is a material for each texture tile used rather than for each
+        block type, named after the tile and coloured with its average. So
+        blocks that share a tile, such as the bottom of grass and dirt,
+        share a material, and the top and sides of one block can differ.
+        """
+        self._stream_output("three_mf", fileobj, self._write_3mf)
 
     def _as_csv(self):
+        columns = self._get_csv_columns()
         lines = []
         for z in range(self.depth + 1):
             blocks = []
             for x in range(self.width + 1):
-                for y in range(self.height + 1):
-                    block_id, block_data = self.reader.get(x, self.height - y, z)
-                    if block_id != 0:
-                        blocks.append("%s:%s" % (block_id, block_data))
-                        continue
+                # the row and column past the edge of the model are always empty
+                blocks.extend(columns.get((x, z), ()))
                 blocks.append(",")
             lines.append("".join(blocks))
             lines.append("\n")
         
         return "".join(lines)
+
+    def _get_csv_columns(self):
+        # the blocks of each x, z column top down as id:data
+        columns = {}
+        views = self.reader.views()
+        if views is None:
+            # only the occupied cells so sparse models aren't filled in
+            for x, y, z in self.reader.occupied():
+                block_id, block_data = self.reader.get(x, y, z)
+                if block_id != 0:
+                    columns.setdefault((x, z), []).append("%s:%s" % (block_id, block_data))
+            for column in columns.values():
+                column.reverse()
+            return columns
+        block_ids, block_data = views
+        for y in range(self.height - 1, -1, -1):
+            for z in range(self.depth):
+                for x in range(self.width):
+                    i = (y * self.depth + z) * self.width + x
+                    if block_ids[i] != 0:
+                        columns.setdefault((x, z), []).append("%s:%s" % (block_ids[i], block_data[i]))
+        return columns
         
     def _as_schematic(self):
         nbtfile = nbt.NBTFile()
@@ -481,18 +848,16 @@ class BlockModel(object):
         nbtfile.tags.append(nbt.TAG_Int(name="WEOriginY", value=0))
         nbtfile.tags.append(nbt.TAG_Int(name="WEOriginZ", value=0))
         
-        # YZX ordering
-       
-        data = bytearray()
-        blocks = bytearray()
-      
-        for y in range(self.height):
-            for z in range(self.depth):
-                for x in range(self.width):
-                    block_id, block_data = self.reader.get(x, y, z)
-                    blocks.append(block_id)
-                    data.append(block_data)
-           
+        # YZX ordering, the same as the reader's arrays
+        views = self.reader.views()
+        if views is not None:
+            # straight from the reader's storage, only copied when written
+            blocks, data = views
+        else:
+            block_ids, block_data = self.reader.to_arrays()
+            blocks = bytearray(array("B", block_ids))
+            data = bytearray(block_data)
+
         blocks_tag = nbt.TAG_Byte_Array()
         blocks_tag.value = blocks
 
@@ -513,52 +878,97 @@ class BlockModel(object):
         return as_nbt
 
     def _as_collada(self):
-        
+        return self._render_to_string(self._write_collada)
+
+    def _write_collada(self, fileobj):
+        self._ensure_mesh()
         attrs = {}
-        ordered_vertices = self._get_ordered_vertices()
-        vertix_lines = ["%.5g %.5g %.5g" % v for v in ordered_vertices]
-        zeroindexfaces = [[x-1 for x in f] for f in self.faces]
-        face_lines = ["%i %i %i %i %i %i %i %i" % tuple(f) for f in zeroindexfaces]
-        attrs["obj_vertex_source_array"] = " ".join(vertix_lines)
-        attrs["obj_vertex_source_array_accessor_count"] = str(len(ordered_vertices))
-        attrs["obj_vertex_source_array_count"] = str(len(ordered_vertices) * 3)
-        attrs["obj_uv_source_array"] = " ".join(["%.5g %.5g" % uv for uv in self.texUvMappingsArray])
-        attrs["polylist_p"] = " ".join(face_lines)
-        attrs["vcount"] = " ".join("4" * len(self.faces))
-        attrs["polylist_count"] = str(len(self.faces))
+        attrs["obj_vertex_source_array"] = _join_chunks(self._get_vertex_points())
+        attrs["obj_vertex_source_array_accessor_count"] = str(len(self._vertices))
+        attrs["obj_vertex_source_array_count"] = str(len(self._vertices) * 3)
+        attrs["obj_uv_source_array"] = _join_chunks(u"%.5g %.5g" % uv for uv in self.texUvMappingsArray)
+        attrs["polylist_p"] = _join_chunks(u"%i %i %i %i %i %i %i %i" % f for f in self._get_face_indices())
+        attrs["vcount"] = _join_chunks(u"4" for _ in range(self.face_count))
+        attrs["polylist_count"] = str(self.face_count)
         attrs["timestamp"] = self.timestamp
-        template = jinja_env.get_template("collada2.xml")
-        as_col = template.render(attrs)
-        return str(as_col)
+        _write_template(fileobj, "collada2.xml", attrs)
 
     def _as_obj(self):
-        
-        ordered_vertices = self._get_ordered_vertices()
-        vertix_lines = ["v %.5f %.5f %.5f" % v for v in ordered_vertices]
-        face_lines = ["f %i/%i %i/%i %i/%i %i/%i" % tuple(f) for f in self.faces]
-        
-        objstr = "#A printcraft model\n"
-        objstr += "mtllib printcraft.mtl\n"
-        objstr += "o printcraft-model\n"
-        objstr += "\n".join(vertix_lines)
-        objstr += "\n"
-        objstr += self.uv_mappings
-        objstr += "\ng blocks\n"
-        objstr += "usemtl minecraftblocks\n"
-        objstr += "s off\n"
-        objstr += "\n".join(face_lines)
-        return objstr
+        return self._render_to_string(self._write_obj)
+
+    def _write_obj(self, fileobj):
+        self._ensure_mesh()
+        fileobj.write(u"#A printcraft model\n")
+        fileobj.write(u"mtllib printcraft.mtl\n")
+        fileobj.write(u"o printcraft-model\n")
+        if not self._vertices:
+            fileobj.write(u"\n")
+        for start in range(0, len(self._vertices), STREAM_LINES):
+            vertices = self._get_ordered_vertices(start, start + STREAM_LINES)
+            fileobj.write(u"".join([u"v %.5f %.5f %.5f\n" % v for v in vertices]))
+        fileobj.write(u"%s" % self.uv_mappings)
+        fileobj.write(u"\ng blocks\n")
+        fileobj.write(u"usemtl minecraftblocks\n")
+        fileobj.write(u"s off\n")
+        for chunk in _join_chunks((u"f %i/%i %i/%i %i/%i %i/%i" % f for f in self._get_face_indices(1)), u"\n"):
+            fileobj.write(chunk)
+
+    def _render_to_string(self, write):
+        output = StringIO()
+        write(output)
+        rendered = output.getvalue()
+        output.close()
+        return str(rendered)
+
+    def _stream_output(self, name, fileobj, write):
+        with self._time("stream_%s" % name):
+            output = self._outputs.get(name)
+            if output is not None:
+                fileobj.write(output)
+            else:
+                write(fileobj)
+
+    def stream_obj(self, fileobj):
+        """
+        Writes the model to fileobj, opened for text, as OBJ a few thousand
+        lines at a time.
+        """
+        self._stream_output("obj", fileobj, self._write_obj)
+
+    def stream_x3d(self, fileobj, indexed=False):
+        """
+        Writes the model to fileobj, opened for text, as the x3d property's
+        triangles, or as x3d_indexed if indexed is true. The coordinate, index
+        and texture arrays are written a few thousand entries at a time rather
+        than built whole.
+        """
+        if indexed:
+            self._stream_output("x3d_indexed", fileobj, self._write_x3d_indexed)
+        else:
+            self._stream_output("x3d", fileobj, self._write_x3d_triangles)
+
+    def stream_x3d_faces(self, fileobj):
+        """
+        Writes the model to fileobj as the x3d_faces property, see stream_x3d.
+        """
+        self._stream_output("x3d_faces", fileobj, self._write_x3d_faces)
+
+    def stream_collada(self, fileobj):
+        """
+        Writes the model to fileobj as the collada property, see stream_x3d.
+        """
+        self._stream_output("collada", fileobj, self._write_collada)
 
     def _add_corners(self, corners, tex_x, tex_y, quad_x=None, quad_y=None):
-        faceinfo = []
         for counter, corner in enumerate(corners):
-            i = self.vertices.get(corner)
+            key = (corner[0] << VERTEX_BITS * 2) | (corner[1] << VERTEX_BITS) | corner[2]
+            i = self._vertices.get(key)
             if i is None:
-                i = len(self.vertices)
-                self.vertices[corner] = i
-            faceinfo.append(i + 1)
-            faceinfo.append(self._get_vt_index(counter, tex_x, tex_y, quad_x, quad_y))
-        self.faces.append(faceinfo)
+                i = len(self._vertices)
+                self._vertices[key] = i
+                self.vertex_coords.extend(corner)
+            self.face_vertices.append(i)
+            self.face_uvs.append(self._get_vt_index(counter, tex_x, tex_y, quad_x, quad_y) - 1)
         
     def _get_vt_index(self, corner, blockx, blocky, quad_x=None, quad_y=None):
 
@@ -596,40 +1006,77 @@ class BlockModel(object):
             if corner == 3:
                 return ((y + 1) * 33) + x + 2  
 
+    def _get_bounds(self):
+        return (self._min_x, self._max_x, self._min_y, self._max_y, self._min_z, self._max_z)
+
+    def _set_bounds(self, bounds):
+        self._min_x, self._max_x, self._min_y, self._max_y, self._min_z, self._max_z = bounds
+
+    def _ensure_bounds(self):
+        # streaming STL keeps the bounds and volume without the mesh
+        if self._min_x is None:
+            self._ensure_mesh()
+
     def _get_content_width(self):
-        return self.max_x - self.min_x
+        self._ensure_bounds()
+        return self._max_x - self._min_x
 
     def _get_content_height(self):
-        return self.max_y - self.min_y
+        self._ensure_bounds()
+        return self._max_y - self._min_y
 
     def _get_content_depth(self):
-        return self.max_z - self.min_z
+        self._ensure_bounds()
+        return self._max_z - self._min_z
 
 
     ## file out helpers
 
     def save_as_stl(self, file_path):
-        write_stl(file_path, self.stl)
+        write_stl_stream(file_path, self.stream_stl)
 
     def save_as_csv(self, file_path):
         write_csv(file_path, self.csv)
 
-    def save_as_x3d(self, file_path):
-        write_x3d(file_path, self.x3d)
+    def save_as_x3d(self, file_path, indexed=False):
+        write_x3d_stream(file_path, lambda f: self.stream_x3d(f, indexed))
 
     def save_as_collada(self, file_path):
-        write_collada(file_path, self.collada)
+        write_collada_stream(file_path, self.stream_collada)
+
+    def save_as_glb(self, file_path):
+        write_glb(file_path, self.glb)
+
+    def save_as_ply(self, file_path, block_ids=False):
+        write_ply(file_path, self.ply_blocks if block_ids else self.ply)
+
+    def save_as_3mf(self, file_path):
+        write_3mf_stream(file_path, self.stream_3mf)
 
     def save_as_obj(self, file_path):
-        write_obj(file_path, self.obj)
-
-    obj = property(_as_obj)
-    x3d = property(_as_x3d_triangles)
-    x3d_triangles = property(_as_x3d_triangles)
-    x3d_faces = property(_as_x3d_faces)
-    collada = property(_as_collada)
-    csv = property(_as_csv)
-    schematic = property(_as_schematic)
+        write_obj_stream(file_path, self.stream_obj)
+
+    stl = _CachedOutput("stl", _make_stl)
+    obj = _CachedOutput("obj", _as_obj)
+    x3d = _CachedOutput("x3d", _as_x3d_triangles)
+    x3d_triangles = _CachedOutput("x3d", _as_x3d_triangles)
+    x3d_faces = _CachedOutput("x3d_faces", _as_x3d_faces)
+    x3d_indexed = _CachedOutput("x3d_indexed", _as_x3d_indexed)
+    collada = _CachedOutput("collada", _as_collada)
+    glb = _CachedOutput("glb", _as_glb)
+    ply = _CachedOutput("ply", _as_ply)
+    ply_blocks = _CachedOutput("ply_blocks", _as_ply_blocks)
+    three_mf = _CachedOutput("three_mf", _as_3mf)
+    csv = _CachedOutput("csv", _as_csv)
+    schematic = _CachedOutput("schematic", _as_schematic)
     content_width = property(_get_content_width)
     content_height = property(_get_content_height)
     content_depth = property(_get_content_depth)
+    volume = _mesh_attribute("_volume", "_ensure_bounds")
+    vertices = _mesh_attribute("_vertices", "_ensure_mesh")
+    min_x = _mesh_attribute("_min_x", "_ensure_bounds")
+    max_x = _mesh_attribute("_max_x", "_ensure_bounds")
+    min_y = _mesh_attribute("_min_y", "_ensure_bounds")
+    max_y = _mesh_attribute("_max_y", "_ensure_bounds")
+    min_z = _mesh_attribute("_min_z", "_ensure_bounds")
+    max_z = _mesh_attribute("_max_z", "_ensure_bounds")
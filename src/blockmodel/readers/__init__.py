@@ -2,11 +2,15 @@
 from .json_array import JsonModelReader
 from .png_reader import PngModelReader
 from .schematic import SchematicModelReader
+from .mapped_schematic import MappedSchematicModelReader
 from .sparse_json import SparseJsonModelReader
+from .region import RegionModelReader
 
 __all__ = (
     "JsonModelReader",
     "PngModelReader",
     "SchematicModelReader",
-    "SparseJsonModelReader"
+    "MappedSchematicModelReader",
+    "SparseJsonModelReader",
+    "RegionModelReader"
 )
\ No newline at end of file
@@ -1,3 +1,20 @@
+from array import array
+
+# the most a region can hold, see empty_region
+MAX_BLOCK_ID = 0xFFFF
+MAX_BLOCK_DATA = 0xFF
+
+
+def empty_region(width, height, depth):
+    """
+    Returns blocks and data arrays of zeros for a box of the given size.
+
+    Regions are laid out in YZX order like schematics, the cell at x, y, z
+    is at index (y * depth + z) * width + x. Block ids are unsigned shorts
+    in an array('H') and data values unsigned bytes in an array('B').
+    """
+    size = width * height * depth
+    return array("H", [0]) * size, array("B", [0]) * size
 
 
 class BaseModelReader(object):
@@ -5,7 +22,55 @@ class BaseModelReader(object):
     def get(self, x, y, z):
         return 0, 0
 
+    def get_region(self, x, y, z, width, height, depth):
+        """
+        Returns (blocks, data) for the box starting at x, y, z, see empty_region
+        for the layout. Cells outside the model are 0, 0 just as for get.
+        """
+        blocks, data = empty_region(width, height, depth)
+        i = 0
+        for yy in range(y, y + height):
+            for zz in range(z, z + depth):
+                for xx in range(x, x + width):
+                    blocks[i], data[i] = self.get(xx, yy, zz)
+                    i += 1
+        return blocks, data
+
+    def occupied(self, x_start=0, x_stop=None):
+        """
+        Returns an iterable of the x, y, z positions from x_start up to x_stop
+        that might hold a block, in x, y, z order. Cells left out must be
+        empty, by default none are.
+        """
+        if x_stop is None:
+            x_stop = self.width
+        return ((x, y, z) for x in range(x_start, x_stop) for y in range(self.height) for z in range(self.depth))
+
+    def views(self):
+        """
+        Returns (blocks, data) as memoryviews of unsigned bytes over the
+        reader's own storage, in the same YZX order as to_arrays, or None if
+        the reader does not hold the whole volume that way.
+        """
+        return None
+
+    def to_arrays(self):
+        """
+        Returns (blocks, data) for the whole model, see get_region.
+        """
+        return self.get_region(0, 0, 0, self.width, self.height, self.depth)
+
+    def check_blocks(self, blocks):
+        """
+        Raises a ValueError for the first id, data pair in blocks that a
+        region can't hold.
+        """
+        for block_id, block_data in blocks:
+            if not (0 <= block_id <= MAX_BLOCK_ID and 0 <= block_data <= MAX_BLOCK_DATA):
+                raise ValueError("Block %s:%s is out of range, ids go up to %i and data up to %i" %
+                                 (block_id, block_data, MAX_BLOCK_ID, MAX_BLOCK_DATA))
+
     def check_size(self, max_size):
         if max_size is not None:
             if self.width > max_size or self.height > max_size or self.depth > max_size:
-                raise Exception("Model too big, max is %s" % max_size)
\ No newline at end of file
+                raise Exception("Model too big, max is %s" % max_size)
@@ -1,5 +1,5 @@
 import json
-from .base import BaseModelReader
+from .base import BaseModelReader, empty_region
 
 
 class JsonModelReader(BaseModelReader):
@@ -10,10 +10,27 @@ class JsonModelReader(BaseModelReader):
         self.height = len(self.as_array[0])
         self.depth = len(self.as_array[0][0])
         self.check_size(max_size)
+        self.check_blocks((cell[0], cell[1]) for column in self.as_array for row in column for cell in row)
 
     def get(self, x, y, z):
         if x < 0 or y < 0 or z < 0 or x >= self.width or y >= self.height or z >= self.depth:
             return 0, 0
         block = self.as_array[x][y][z][0]
         data = self.as_array[x][y][z][1]
-        return block, data
\ No newline at end of file
+        return block, data
+
+    def get_region(self, x, y, z, width, height, depth):
+        blocks, data = empty_region(width, height, depth)
+        xs = range(max(x, 0), min(x + width, self.width))
+        ys = range(max(y, 0), min(y + height, self.height))
+        zs = range(max(z, 0), min(z + depth, self.depth))
+        for xx in xs:
+            column = self.as_array[xx]
+            for yy in ys:
+                row = column[yy]
+                i = (yy - y) * depth * width + xx - x
+                for zz in zs:
+                    j = i + (zz - z) * width
+                    blocks[j] = row[zz][0]
+                    data[j] = row[zz][1]
+        return blocks, data
@@ -0,0 +1,147 @@
+import gzip
+import mmap
+import shutil
+import struct
+import sys
+import tempfile
+
+from .schematic import SchematicModelReader
+
+TAG_END = 0
+TAG_SHORT = 2
+TAG_BYTE_ARRAY = 7
+TAG_STRING = 8
+TAG_LIST = 9
+TAG_COMPOUND = 10
+TAG_INT_ARRAY = 11
+TAG_LONG_ARRAY = 12
+
+# payload sizes of the fixed size tags
+TAG_SIZES = {1: 1, 2: 2, 3: 4, 4: 8, 5: 4, 6: 8}
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class MappedSchematicModelReader(SchematicModelReader):
+    """
+    Reads a schematic without loading its block arrays into memory.
+
+    A gzipped schematic is decompressed once to an anonymous temporary file,
+    an uncompressed one is used as it is. The NBT is scanned for the offsets
+    of the Blocks and Data arrays, skipping over everything else, and the
+    file is memory mapped so only the pages that are touched get read.
+
+    Needs Python 3, Python 2 can't make a memoryview of a mapping.
+    """
+
+    def __init__(self, schematic_file_path, max_size):
+        if sys.version_info[0] < 3:
+            raise Exception("Memory mapped schematics need Python 3")
+        self.mmap = None
+        with open(schematic_file_path, "rb") as f:
+            compressed = f.read(2) == GZIP_MAGIC
+        if compressed:
+            nbt_file = tempfile.TemporaryFile()
+            with gzip.open(schematic_file_path, "rb") as src:
+                shutil.copyfileobj(src, nbt_file)
+            nbt_file.seek(0)
+        else:
+            nbt_file = open(schematic_file_path, "rb")
+
+        try:
+            tags = self._scan(nbt_file)
+            self.width = tags[u"Width"]
+            self.height = tags[u"Height"]
+            self.depth = tags[u"Length"]
+            self.check_size(max_size)
+            blocks_offset, blocks_length = tags[u"Blocks"]
+            data_offset, data_length = tags[u"Data"]
+            size = self.width * self.height * self.depth
+            if blocks_length != size or data_length != size:
+                raise ValueError("Schematic is %ix%ix%i but has %i blocks and %i data values" %
+                                 (self.width, self.height, self.depth, blocks_length, data_length))
+            if blocks_length and data_length:
+                # the mapping stays valid once the file is closed
+                self.mmap = mmap.mmap(nbt_file.fileno(), 0, access=mmap.ACCESS_READ)
+                view = memoryview(self.mmap)
+            else:
+                view = memoryview(b"")
+        except KeyError as e:
+            raise Exception("Schematic is missing the %s tag" % e)
+        finally:
+            nbt_file.close()
+
+        self.blocks_view = view[blocks_offset:blocks_offset + blocks_length]
+        self.data_view = view[data_offset:data_offset + data_length]
+
+    def close(self):
+        self.blocks_view.release()
+        self.data_view.release()
+        if self.mmap is not None:
+            self.mmap.close()
+            self.mmap = None
+
+    def _scan(self, f):
+        """
+        Returns the size tags' values and the offset and length of the
+        block arrays found in the root compound.
+        """
+        found = {}
+        if self._read_byte(f) != TAG_COMPOUND:
+            raise Exception("Schematic does not start with a compound tag")
+        self._read_string(f)
+        while True:
+            tag_type = self._read_byte(f)
+            if tag_type == TAG_END:
+                return found
+            name = self._read_string(f)
+            if tag_type == TAG_SHORT and name in (u"Width", u"Height", u"Length"):
+                found[name] = struct.unpack(">h", f.read(2))[0]
+            elif tag_type == TAG_BYTE_ARRAY and name in (u"Blocks", u"Data"):
+                length = self._read_int(f)
+                found[name] = (f.tell(), length)
+                f.seek(length, 1)
+            else:
+                self._skip(f, tag_type)
+
+    def _skip(self, f, tag_type):
+        if tag_type in TAG_SIZES:
+            f.seek(TAG_SIZES[tag_type], 1)
+        elif tag_type == TAG_BYTE_ARRAY:
+            f.seek(self._read_int(f), 1)
+        elif tag_type == TAG_STRING:
+            self._read_string(f)
+        elif tag_type == TAG_LIST:
+            item_type = self._read_byte(f)
+            length = self._read_int(f)
+            if item_type in TAG_SIZES:
+                f.seek(TAG_SIZES[item_type] * length, 1)
+            else:
+                for _ in range(length):
+                    self._skip(f, item_type)
+        elif tag_type == TAG_COMPOUND:
+            while True:
+                item_type = self._read_byte(f)
+                if item_type == TAG_END:
+                    break
+                self._read_string(f)
+                self._skip(f, item_type)
+        elif tag_type == TAG_INT_ARRAY:
+            f.seek(self._read_int(f) * 4, 1)
+        elif tag_type == TAG_LONG_ARRAY:
+            f.seek(self._read_int(f) * 8, 1)
+        else:
+            raise Exception("Unrecognised NBT tag type %s" % tag_type)
+
+    def _read_byte(self, f):
+        b = f.read(1)
+        if not b:
+            raise Exception("Schematic ended unexpectedly")
+        return ord(b)
+
+    def _read_int(self, f):
+        return struct.unpack(">i", f.read(4))[0]
+
+    def _read_string(self, f):
+        length = struct.unpack(">H", f.read(2))[0]
+        return f.read(length).decode("utf-8")
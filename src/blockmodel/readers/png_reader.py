@@ -1,5 +1,6 @@
 
-from .base import BaseModelReader
+from array import array
+from .base import BaseModelReader, empty_region
 from . import png
 
 
@@ -19,4 +20,18 @@ class PngModelReader(BaseModelReader):
         red_value = self.as_array[pixel]
         block = red_value
         data = 0
-        return block, data
\ No newline at end of file
+        return block, data
+
+    def get_region(self, x, y, z, width, height, depth):
+        blocks, data = empty_region(width, height, depth)
+        # the model is a single layer so only y = 0 has any blocks
+        start = max(x, 0)
+        stop = min(x + width, self.width)
+        if y > 0 or y + height <= 0 or stop <= start:
+            return blocks, data
+        planes = self.meta["planes"]
+        for zz in range(max(z, 0), min(z + depth, self.depth)):
+            j = (-y * depth + zz - z) * width + start - x
+            row = planes * zz * self.width
+            blocks[j:j + stop - start] = array("H", self.as_array[row + planes * start:row + planes * stop:planes])
+        return blocks, data
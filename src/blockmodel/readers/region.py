@@ -0,0 +1,55 @@
+from .base import BaseModelReader, empty_region
+
+
+class RegionModelReader(BaseModelReader):
+    """
+    Holds one box of a larger model, as returned by get_region.
+
+    Positions are in the whole model's coordinates and width, height and
+    depth are the whole model's, anything outside the box reads as 0, 0.
+    """
+
+    def __init__(self, blocks, data, origin, size, dimensions):
+        self.blocks = blocks
+        self.data = data
+        self.x, self.y, self.z = origin
+        self.region_width, self.region_height, self.region_depth = size
+        self.width, self.height, self.depth = dimensions
+
+    def get(self, x, y, z):
+        x -= self.x
+        y -= self.y
+        z -= self.z
+        if(x < 0 or y < 0 or z < 0 or x >= self.region_width or y >= self.region_height or z >= self.region_depth):
+            return 0, 0
+        i = (y * self.region_depth + z) * self.region_width + x
+        return self.blocks[i], self.data[i]
+
+    def occupied(self, x_start=0, x_stop=None):
+        if x_stop is None:
+            x_stop = self.width
+        cells = []
+        for i, block in enumerate(self.blocks):
+            if block:
+                row, x = divmod(i, self.region_width)
+                x += self.x
+                if x_start <= x < x_stop:
+                    y, z = divmod(row, self.region_depth)
+                    cells.append((x, y + self.y, z + self.z))
+        cells.sort()
+        return cells
+
+    def get_region(self, x, y, z, width, height, depth):
+        blocks, data = empty_region(width, height, depth)
+        # both are in YZX order so copy whole rows
+        start = max(x, self.x)
+        stop = min(x + width, self.x + self.region_width)
+        if stop <= start:
+            return blocks, data
+        for yy in range(max(y, self.y), min(y + height, self.y + self.region_height)):
+            for zz in range(max(z, self.z), min(z + depth, self.z + self.region_depth)):
+                j = ((yy - y) * depth + zz - z) * width + start - x
+                i = ((yy - self.y) * self.region_depth + zz - self.z) * self.region_width - self.x
+                blocks[j:j + stop - start] = self.blocks[i + start:i + stop]
+                data[j:j + stop - start] = self.data[i + start:i + stop]
+        return blocks, data
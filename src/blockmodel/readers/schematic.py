@@ -1,6 +1,7 @@
 
+from array import array
 from nbt import nbt
-from .base import BaseModelReader
+from .base import BaseModelReader, empty_region
 
 class SchematicModelReader(BaseModelReader):
 
@@ -14,12 +15,30 @@ class SchematicModelReader(BaseModelReader):
         self.check_size(max_size)
         self.blocks = nbtfile[u"Blocks"]
         self.data = nbtfile[u"Data"]
-
-
+        # views straight onto the tags' bytearrays, nothing is copied
+        self.blocks_view = memoryview(self.blocks.value)
+        self.data_view = memoryview(self.data.value)
 
     def get(self, x, y, z):
         if(x < 0 or y < 0 or z < 0 or x >= self.width or y >= self.height or z >= self.depth):
             return 0, 0
-        block = self.blocks[self.width * self.depth * y + self.width * z + x]
-        data = self.data[self.width * self.depth * y + self.width * z + x]
-        return block, data
\ No newline at end of file
+        i = self.width * self.depth * y + self.width * z + x
+        return self.blocks_view[i], self.data_view[i]
+
+    def views(self):
+        return self.blocks_view, self.data_view
+
+    def get_region(self, x, y, z, width, height, depth):
+        blocks, data = empty_region(width, height, depth)
+        # schematics are stored in the same YZX order so copy whole rows
+        start = max(x, 0)
+        stop = min(x + width, self.width)
+        if stop <= start:
+            return blocks, data
+        for yy in range(max(y, 0), min(y + height, self.height)):
+            for zz in range(max(z, 0), min(z + depth, self.depth)):
+                j = ((yy - y) * depth + zz - z) * width + start - x
+                i = self.width * self.depth * yy + self.width * zz
+                blocks[j:j + stop - start] = array("H", self.blocks_view[i + start:i + stop].tolist())
+                data[j:j + stop - start] = array("B", self.data_view[i + start:i + stop])
+        return blocks, data
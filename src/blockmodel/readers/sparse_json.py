@@ -1,6 +1,7 @@
 import json
+from bisect import bisect_left
 
-from .base import BaseModelReader
+from .base import BaseModelReader, empty_region
 
 
 class SparseJsonModelReader(BaseModelReader):
@@ -30,10 +31,31 @@ class SparseJsonModelReader(BaseModelReader):
         self.depth = (self.max_z - self.min_z) + 1
 
         self.check_size(max_size)
+        self.check_blocks(self.as_dict.values())
+        self.cells = None
 
 
     def get(self, x, y, z):
         block = self.as_dict.get((x+self.min_x, y+self.min_y, z+self.min_z))
         if block is None:
             return 0, 0
-        return block
\ No newline at end of file
+        return block
+
+    def occupied(self, x_start=0, x_stop=None):
+        if self.cells is None:
+            self.cells = sorted((p[0] - self.min_x, p[1] - self.min_y, p[2] - self.min_z) for p in self.as_dict)
+        if x_stop is None:
+            x_stop = self.width
+        return self.cells[bisect_left(self.cells, (x_start,)):bisect_left(self.cells, (x_stop,))]
+
+    def get_region(self, x, y, z, width, height, depth):
+        blocks, data = empty_region(width, height, depth)
+        # only the cells in the region's range of x
+        for position in self.occupied(x, x + width):
+            xx = position[0] - x
+            yy = position[1] - y
+            zz = position[2] - z
+            if 0 <= yy < height and 0 <= zz < depth:
+                i = (yy * depth + zz) * width + xx
+                blocks[i], data[i] = self.get(*position)
+        return blocks, data
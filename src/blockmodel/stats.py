@@ -0,0 +1,81 @@
+import time
+
+timer = getattr(time, "perf_counter", time.time)
+
+
+class Stats(object):
+    """
+    Wall times and counters for a model's conversion.
+
+    Pass one to a BlockModel as stats. Times are in seconds per stage and add
+    up if a stage runs more than once. The stages are read, process, each
+    output rendered by name, such as stl or obj, and stream_stl. Counters are
+    voxels visited, reader gets, faces, vertices, vertices deduplicated and
+    bytes per output. Gets made by worker processes are not counted.
+
+    callback, if given, is called as callback(stage, seconds, stats) as each
+    stage finishes, to pass them on to a metrics system.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.times = {}
+        self.counters = {}
+
+    def time(self, stage):
+        return StageTimer(self, stage)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, stage, seconds):
+        self.times[stage] = self.times.get(stage, 0.0) + seconds
+        if self.callback is not None:
+            self.callback(stage, seconds, self)
+
+    def as_dict(self):
+        return {"times": dict(self.times), "counters": dict(self.counters)}
+
+
+class StageTimer(object):
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = timer()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.add_time(self.stage, timer() - self.start)
+        return False
+
+
+class NullTimer(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class CountingReader(object):
+    """
+    Counts the gets made on a reader, everything else is passed through.
+    """
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.gets = 0
+
+    def get(self, x, y, z):
+        self.gets += 1
+        return self.reader.get(x, y, z)
+
+    def __getattr__(self, name):
+        return getattr(self.reader, name)
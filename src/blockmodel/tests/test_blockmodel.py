@@ -1,6 +1,9 @@
 import os
 import shutil
 import json
+import struct
+import zipfile
+from io import BytesIO, StringIO
 import unittest
 from lxml import etree
 # import xml.etree.ElementTree as ET
@@ -10,12 +13,31 @@ MADE_DIR = os.path.join(DATA_DIR, "made")
 
 import blockmodel
 from blockmodel import BlockModel
+from blockmodel.meshers import vectorized, GreedyMerger
+from blockmodel.constants import SIDE_TOP
+from blockmodel.stats import Stats, CountingReader
+from blockmodel.writers.stl_writer import Binary_STL_Writer
 
 
 def data_path(pth):
     return os.path.join(DATA_DIR, pth)
 
 
+def stl_triangles(stl):
+    return struct.unpack("<I", stl[80:84])[0]
+
+
+def stl_area(stl):
+    area = 0.0
+    for i in range(stl_triangles(stl)):
+        v = struct.unpack("<9f", stl[96 + i * 50:132 + i * 50])
+        a = [v[3] - v[0], v[4] - v[1], v[5] - v[2]]
+        b = [v[6] - v[0], v[7] - v[1], v[8] - v[2]]
+        cross = (a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0])
+        area += sum(c * c for c in cross) ** 0.5 / 2.0
+    return area
+
+
 class BlockModelTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -271,6 +293,680 @@ class BlockModelTestCase(unittest.TestCase):
         xmlschema.validate(x3dxml)
 
 
+@unittest.skipIf(vectorized.np is None, "numpy is not installed")
+class VectorizedModeTestCase(unittest.TestCase):
+
+    def assertModelsMatch(self, default_model, vectorized_model):
+        self.assertEqual(default_model.stl, vectorized_model.stl)
+        self.assertEqual(default_model.obj, vectorized_model.obj)
+        self.assertEqual(default_model.volume, vectorized_model.volume)
+
+    def test_json(self):
+        with open(data_path("ref/073985f1c3e2f26c5be4a01073de42d3"), "r") as f:
+            as_json = f.read()
+        self.assertModelsMatch(BlockModel.from_json(as_json),
+                               BlockModel.from_json(as_json, mode="vectorized"))
+
+    def test_schematic_steps(self):
+        path = data_path("ref/cup2.schematic")
+        self.assertModelsMatch(BlockModel.from_schematic_file(path),
+                               BlockModel.from_schematic_file(path, mode="vectorized"))
+
+    def test_mixed_blocks(self):
+        # cubes, slabs both ways up, stairs and unknown ids next to each other
+        as_list = [[0, 0, 0, 1, 0],
+                   [1, 0, 0, 44, 0],
+                   [2, 0, 0, 44, 8],
+                   [0, 1, 0, 53, 0],
+                   [1, 1, 0, 53, 2],
+                   [0, 0, 1, 67, 5],
+                   [1, 0, 1, 999, 0],
+                   [2, 1, 1, 35, 14],
+                   [2, 0, 1, 3, 0]]
+        as_json = json.dumps(as_list)
+        self.assertModelsMatch(BlockModel.from_sparse_json(as_json),
+                               BlockModel.from_sparse_json(as_json, mode="vectorized"))
+
+    def test_chunks(self):
+        # a column of x at a time gives the same as the whole model at once
+        path = data_path("ref/cup2.schematic")
+        for mode in ("vectorized", "halfgrid"):
+            whole = BlockModel.from_schematic_file(path, mode=mode)
+            whole.obj
+            chunk_blocks, min_chunk_width = vectorized.CHUNK_BLOCKS, vectorized.MIN_CHUNK_WIDTH
+            vectorized.CHUNK_BLOCKS, vectorized.MIN_CHUNK_WIDTH = 1, 1
+            try:
+                self.assertModelsMatch(whole, BlockModel.from_schematic_file(path, mode=mode))
+            finally:
+                vectorized.CHUNK_BLOCKS, vectorized.MIN_CHUNK_WIDTH = chunk_blocks, min_chunk_width
+
+    def test_bad_mode(self):
+        self.assertRaises(Exception, BlockModel.from_schematic_file, data_path("ref/cup2.schematic"), mode="bogus")
+
+
+class LazyMeshTestCase(unittest.TestCase):
+
+    def test_schematic_does_not_mesh(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"))
+        model.schematic
+        model.csv
+        self.assertEqual(model.face_count, 0)
+
+    def test_mesh_on_first_use(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"))
+        model.obj
+        faces = len(model.faces)
+        self.assertTrue(faces > 0)
+        model.x3d
+        with open(data_path("ref/cup2.stl"), "rb") as f:
+            self.assertEqual(f.read(), model.stl)
+        self.assertEqual(len(model.faces), faces)
+
+    def test_mesh_attributes(self):
+        as_json = "[[[[1, 0]], [[44, 0]]]]"
+        model = BlockModel.from_json(as_json)
+        # read before any output, they mesh the model themselves
+        self.assertEqual(model.volume, 12.0)
+        self.assertEqual(len(model.faces), model.face_count)
+        # bounds are in STL coordinates, with z up
+        self.assertEqual((model.min_z, model.max_z), (0.0, 3.0))
+        model.invalidate()
+        self.assertEqual(model.face_count, 0)
+        self.assertEqual(model.volume, 12.0)
+        self.assertEqual(len(model.vertices), len(BlockModel.from_json(as_json).vertices))
+
+
+class VertexTableTestCase(unittest.TestCase):
+
+    def test_half_block_lattice(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"))
+        model.obj
+        self.assertEqual(len(model.vertex_coords), len(model.vertices) * 3)
+        self.assertEqual(model.vertex_coords.typecode, "i")
+        self.assertEqual(sorted(model.vertices.values()), list(range(len(model.vertices))))
+        # stairs put vertices on the half blocks
+        self.assertTrue(any(c % 2 for c in model.vertex_coords))
+
+    def test_scaled_on_export(self):
+        model = BlockModel.from_json("[[[[1, 0]]]]")
+        model._ensure_mesh()
+        self.assertEqual(model._get_ordered_vertices()[0], (-1.0, 2, -1.0))
+        model.scale = 4
+        self.assertEqual(model._get_ordered_vertices()[0], (-2.0, 4, -2.0))
+
+
+class FaceArraysTestCase(unittest.TestCase):
+
+    def test_face_arrays(self):
+        model = BlockModel.from_sparse_json(json.dumps([[0, 0, 0, 1, 0], [1, 0, 0, 53, 0]]))
+        model._ensure_mesh()
+        self.assertEqual(len(model.face_vertices), model.face_count * 4)
+        self.assertEqual(len(model.face_uvs), model.face_count * 4)
+        self.assertEqual(sorted(set(model.face_blocks)), [1, 53])
+        self.assertEqual(sorted(set(model.face_sides)), list(range(6)))
+        self.assertEqual(model.faces[0], [i + 1 for i in next(model._get_face_indices())])
+
+    def test_greedy_block_ids(self):
+        as_list = [[x, 0, 0, 1, 0] for x in range(4)]
+        model = BlockModel.from_sparse_json(json.dumps(as_list), greedy=True)
+        model._ensure_mesh()
+        self.assertEqual(model.face_count, 6)
+        self.assertEqual(list(model.face_blocks), [1] * 6)
+
+
+class OutputCacheTestCase(unittest.TestCase):
+
+    def test_outputs_are_reused(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"))
+        self.assertIs(model.x3d, model.x3d)
+        self.assertIs(model.x3d, model.x3d_triangles)
+        self.assertIs(model.obj, model.obj)
+        self.assertIs(model.stl, model.stl)
+        self.assertIs(model.schematic, model.schematic)
+
+    def test_invalidate(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"))
+        obj = model.obj
+        csv = model.csv
+        model.invalidate("obj")
+        self.assertIsNot(obj, model.obj)
+        self.assertEqual(obj, model.obj)
+        self.assertIs(csv, model.csv)
+        # x3d_triangles is the x3d output under another name
+        x3d = model.x3d
+        model.invalidate("x3d_triangles")
+        self.assertIsNot(x3d, model.x3d)
+        self.assertRaises(Exception, model.invalidate, "ojb")
+        self.assertRaises(Exception, model.invalidate, "faces")
+        model.invalidate()
+        self.assertEqual(model.face_count, 0)
+        self.assertIsNot(csv, model.csv)
+        self.assertEqual(obj, model.obj)
+
+    def test_limit(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"), cache_limit=0)
+        self.assertIsNot(model.obj, model.obj)
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"), cache_limit=len(model.obj))
+        obj = model.obj
+        self.assertIs(obj, model.obj)
+        model.csv
+        self.assertIsNot(obj, model.obj)
+
+
+class UnseekableStream(object):
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+
+
+class StreamOBJTestCase(unittest.TestCase):
+
+    def test_matches_obj(self):
+        path = data_path("ref/cup2.schematic")
+        output = StringIO()
+        BlockModel.from_schematic_file(path).stream_obj(output)
+        self.assertEqual(output.getvalue(), BlockModel.from_schematic_file(path).obj)
+
+    def test_many_chunks(self):
+        as_list = [[x, 0, z, 1 + (x + z) % 4, 0] for x in range(40) for z in range(40) if (x + z) % 2]
+        model = BlockModel.from_sparse_json(json.dumps(as_list))
+        output = StringIO()
+        model.stream_obj(output)
+        self.assertTrue(model.face_count > blockmodel.model.STREAM_LINES)
+        self.assertEqual(output.getvalue(), model._as_obj())
+
+    def test_cached(self):
+        model = BlockModel.from_json("[[[[1, 0]]]]")
+        obj = model.obj
+        output = StringIO()
+        model.stream_obj(output)
+        self.assertEqual(output.getvalue(), obj)
+
+
+class StreamXMLTestCase(unittest.TestCase):
+
+    def stream(self, model, name):
+        output = StringIO()
+        getattr(model, "stream_%s" % name)(output)
+        return output.getvalue()
+
+    def test_matches_properties(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"))
+        for name in ("x3d", "x3d_faces", "collada"):
+            streamed = self.stream(model, name)
+            self.assertEqual(streamed, getattr(model, name))
+            # and once cached
+            self.assertEqual(self.stream(model, name), streamed)
+
+    def test_many_chunks(self):
+        as_list = [[x, 0, z, 1 + (x + z) % 4, 0] for x in range(40) for z in range(40) if (x + z) % 2]
+        model = BlockModel.from_sparse_json(json.dumps(as_list))
+        for name, render in (("x3d", model._as_x3d_triangles), ("x3d_faces", model._as_x3d_faces), ("collada", model._as_collada)):
+            self.assertEqual(self.stream(model, name), render())
+        self.assertTrue(model.face_count > blockmodel.model.STREAM_LINES)
+
+    def test_empty(self):
+        model = BlockModel.from_json("[[[[0, 0]]]]")
+        self.assertEqual(self.stream(model, "x3d"), model.x3d)
+        self.assertIn('<Coordinate point=""/>', model.x3d)
+
+
+class IndexedX3DTestCase(unittest.TestCase):
+
+    def triangles(self, x3d):
+        triangle_set = etree.fromstring(x3d.encode("utf-8")).find(".//IndexedTriangleSet")
+        index = [int(i) for i in triangle_set.get("index").split()]
+        points = triangle_set.find("Coordinate").get("point").split()
+        tex_points = triangle_set.find("TextureCoordinate").get("point").split()
+        return [(tuple(points[i * 3:i * 3 + 3]), tuple(tex_points[i * 2:i * 2 + 2])) for i in index]
+
+    def test_same_triangles(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"))
+        indexed = model.x3d_indexed
+        self.assertEqual(self.triangles(indexed), self.triangles(model.x3d))
+        self.assertTrue(len(indexed) < len(model.x3d))
+
+    def test_corners_written_once(self):
+        model = BlockModel.from_json("[[[[1, 0], [1, 0]]]]")
+        model._ensure_mesh()
+        vertex_indices, uv_indices, corners = model._get_uv_vertices()
+        pairs = list(zip(vertex_indices, uv_indices))
+        self.assertEqual(len(pairs), len(set(pairs)))
+        self.assertEqual(len(corners), model.face_count * 4)
+        self.assertEqual(max(corners), len(pairs) - 1)
+
+    def test_stream(self):
+        model = BlockModel.from_json("[[[[1, 0], [2, 0]]]]")
+        output = StringIO()
+        model.stream_x3d(output, indexed=True)
+        self.assertEqual(output.getvalue(), model.x3d_indexed)
+
+
+class GLBTestCase(unittest.TestCase):
+
+    def parse(self, glb):
+        magic, version, length = struct.unpack("<4sII", glb[:12])
+        self.assertEqual((magic, version, length), (b"glTF", 2, len(glb)))
+        json_length, chunk_type = struct.unpack("<I4s", glb[12:20])
+        self.assertEqual(chunk_type, b"JSON")
+        gltf = json.loads(glb[20:20 + json_length].decode("utf-8"))
+        binary = glb[28 + json_length:]
+        return gltf, binary
+
+    def accessor(self, gltf, binary, index):
+        accessor = gltf["accessors"][index]
+        view = gltf["bufferViews"][accessor["bufferView"]]
+        kind = "f" if accessor["componentType"] == 5126 else "I"
+        data = binary[view["byteOffset"]:view["byteOffset"] + view["byteLength"]]
+        return struct.unpack("<%i%s" % (len(data) // 4, kind), data)
+
+    def test_glb(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"))
+        gltf, binary = self.parse(model.glb)
+        self.assertEqual(len(binary), gltf["buffers"][0]["byteLength"])
+        primitive = gltf["meshes"][0]["primitives"][0]
+        indices = self.accessor(gltf, binary, primitive["indices"])
+        self.assertEqual(len(indices), model.face_count * 6)
+        positions = self.accessor(gltf, binary, primitive["attributes"]["POSITION"])
+        self.assertEqual(max(indices), len(positions) // 3 - 1)
+        self.assertEqual(gltf["accessors"][primitive["attributes"]["POSITION"]]["min"], [-5.0, 0.0, -5.0])
+        self.assertEqual(gltf["accessors"][primitive["attributes"]["POSITION"]]["max"], [5.0, 8.0, 5.0])
+        image = gltf["bufferViews"][gltf["images"][0]["bufferView"]]
+        self.assertEqual(binary[image["byteOffset"]:image["byteOffset"] + 8], b"\x89PNG\r\n\x1a\n")
+
+    def test_normals_match_winding(self):
+        model = BlockModel.from_json("[[[[1, 0], [53, 0]], [[44, 0], [0, 0]]]]")
+        gltf, binary = self.parse(model.glb)
+        attributes = gltf["meshes"][0]["primitives"][0]["attributes"]
+        positions = self.accessor(gltf, binary, attributes["POSITION"])
+        normals = self.accessor(gltf, binary, attributes["NORMAL"])
+        indices = self.accessor(gltf, binary, gltf["meshes"][0]["primitives"][0]["indices"])
+        for t in range(0, len(indices), 3):
+            a, b, c = [positions[indices[t + k] * 3:indices[t + k] * 3 + 3] for k in range(3)]
+            u = [b[i] - a[i] for i in range(3)]
+            v = [c[i] - a[i] for i in range(3)]
+            cross = (u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0])
+            for k in range(3):
+                normal = normals[indices[t + k] * 3:indices[t + k] * 3 + 3]
+                self.assertTrue(sum(cross[i] * normal[i] for i in range(3)) > 0)
+
+    def test_empty(self):
+        gltf, binary = self.parse(BlockModel.from_json("[[[[0, 0]]]]").glb)
+        self.assertNotIn("meshes", gltf)
+        self.assertEqual(binary, b"")
+
+
+class PLYTestCase(unittest.TestCase):
+
+    def parse(self, ply, block_ids=False):
+        end = ply.index(b"end_header\n") + len(b"end_header\n")
+        header = ply[:end].decode("ascii").splitlines()
+        self.assertEqual(header[1], "format binary_little_endian 1.0")
+        vertex_count = int([l for l in header if l.startswith("element vertex")][0].split()[2])
+        face_count = int([l for l in header if l.startswith("element face")][0].split()[2])
+        self.assertEqual("property ushort block_id" in header, block_ids)
+        vertices = struct.unpack("<%if" % (vertex_count * 5), ply[end:end + vertex_count * 20])
+        record = struct.Struct("<B4iH" if block_ids else "<B4i")
+        start = end + vertex_count * 20
+        faces = [record.unpack(ply[start + i * record.size:start + (i + 1) * record.size]) for i in range(face_count)]
+        self.assertEqual(len(ply), start + face_count * record.size)
+        return vertices, faces
+
+    def test_ply(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"))
+        vertices, faces = self.parse(model.ply)
+        self.assertEqual(len(faces), model.face_count)
+        ordered_vertices = model._get_ordered_vertices()
+        # every corner has the position and texture coordinate of the obj's
+        for i, face in enumerate(faces):
+            self.assertEqual(face[0], 4)
+            for j, corner in enumerate(face[1:5]):
+                expected = ordered_vertices[model.face_vertices[i * 4 + j]] + model.texUvMappingsArray[model.face_uvs[i * 4 + j]]
+                for got, want in zip(vertices[corner * 5:corner * 5 + 5], expected):
+                    self.assertAlmostEqual(got, want, places=5)
+        # and they are shared
+        self.assertTrue(len(vertices) // 5 < model.face_count * 4)
+
+    def test_block_ids(self):
+        model = BlockModel.from_json("[[[[1, 0], [2, 0]], [[3, 0], [0, 0]]]]")
+        vertices, faces = self.parse(model.ply_blocks, block_ids=True)
+        self.assertEqual([f[5] for f in faces], list(model.face_blocks))
+        self.assertEqual(set(f[5] for f in faces), set([1, 2, 3]))
+        self.assertEqual(self.parse(model.ply)[0], vertices)
+
+    def test_empty(self):
+        vertices, faces = self.parse(BlockModel.from_json("[[[[0, 0]]]]").ply)
+        self.assertEqual((vertices, faces), ((), []))
+
+
+class ThreeMFTestCase(unittest.TestCase):
+
+    def parse(self, as_3mf):
+        package = zipfile.ZipFile(BytesIO(as_3mf))
+        self.assertEqual(sorted(package.namelist()), ["3D/3dmodel.model", "[Content_Types].xml", "_rels/.rels"])
+        root = etree.fromstring(package.read("3D/3dmodel.model"))
+        ns = {"m": "http://schemas.microsoft.com/3dmanufacturing/core/2015/02"}
+        vertices = [tuple(float(v.get(k)) for k in "xyz") for v in root.iterfind(".//m:vertex", ns)]
+        triangles = [tuple(int(t.get(k)) for k in ("v1", "v2", "v3", "p1")) for t in root.iterfind(".//m:triangle", ns)]
+        materials = [(b.get("name"), b.get("displaycolor")) for b in root.iterfind(".//m:base", ns)]
+        return vertices, triangles, materials
+
+    def test_3mf(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"))
+        vertices, triangles, materials = self.parse(model.three_mf)
+        self.assertEqual(len(triangles), model.face_count * 2)
+        self.assertEqual(len(vertices), len(model.vertices))
+        self.assertTrue(len(model.three_mf) < len(model.stl))
+        # closed and facing out, so it encloses the model's volume
+        volume = 0.0
+        for v1, v2, v3, _ in triangles:
+            a, b, c = vertices[v1], vertices[v2], vertices[v3]
+            volume += (a[0] * (b[1] * c[2] - b[2] * c[1]) - a[1] * (b[0] * c[2] - b[2] * c[0]) +
+                       a[2] * (b[0] * c[1] - b[1] * c[0])) / 6.0
+        self.assertAlmostEqual(volume, model.volume, places=6)
+        self.assertEqual(set(t[3] for t in triangles), set(range(len(materials))))
+
+    def test_materials(self):
+        # stone and dirt
+        model = BlockModel.from_json("[[[[1, 0], [0, 0], [3, 0]]]]")
+        vertices, triangles, materials = self.parse(model.three_mf)
+        mapper = model.block_mapper
+        self.assertEqual(materials, [("stone", "#%02X%02X%02X" % mapper.get_tile_colour(0, 0)),
+                                     ("dirt", "#%02X%02X%02X" % mapper.get_tile_colour(2, 15))])
+        self.assertEqual([t[3] for t in triangles], [0] * 12 + [1] * 12)
+
+    def test_materials_are_tiles(self):
+        # grass has a dirt bottom, which dirt shares
+        model = BlockModel.from_json("[[[[2, 0], [0, 0], [3, 0]]]]")
+        vertices, triangles, materials = self.parse(model.three_mf)
+        self.assertEqual(sorted(m[0] for m in materials), ["dirt", "grass_side", "grass_top"])
+
+    def test_stream(self):
+        model = BlockModel.from_json("[[[[1, 0], [2, 0]]]]")
+        output = BytesIO()
+        model.stream_3mf(output)
+        self.assertEqual(output.getvalue(), model.three_mf)
+
+    def test_same_bytes(self):
+        as_json = "[[[[1, 0], [2, 0]]]]"
+        self.assertEqual(BlockModel.from_json(as_json).three_mf, BlockModel.from_json(as_json).three_mf)
+
+    def test_empty(self):
+        # no object or materials rather than an empty mesh
+        model = BlockModel.from_json("[[[[0, 0]]]]")
+        self.assertEqual(self.parse(model.three_mf), ([], [], []))
+        root = etree.fromstring(zipfile.ZipFile(BytesIO(model.three_mf)).read("3D/3dmodel.model"))
+        self.assertEqual([e.tag.split("}")[1] for e in root.iter()], ["model", "metadata", "metadata", "resources", "build"])
+
+
+class StreamSTLTestCase(unittest.TestCase):
+
+    def ref_stl(self):
+        with open(data_path("ref/cup2.stl"), "rb") as f:
+            return f.read()
+
+    def test_stream_unmeshed(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"))
+        output = BytesIO()
+        model.stream_stl(output)
+        self.assertEqual(self.ref_stl(), output.getvalue())
+        # streaming keeps no faces behind, only the bounds
+        self.assertEqual(model.face_count, 0)
+        width, volume = model.content_width, model.volume
+        self.assertFalse(model._meshed)
+        meshed = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"))
+        self.assertEqual(width, meshed.content_width)
+        self.assertEqual(volume, meshed.volume)
+        self.assertTrue(volume > 0)
+        self.assertEqual(self.ref_stl(), model.stl)
+
+    @unittest.skipIf(vectorized.np is None, "numpy is not installed")
+    def test_stream_vectorized(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"), mode="vectorized")
+        output = BytesIO()
+        model.stream_stl(output)
+        self.assertEqual(self.ref_stl(), output.getvalue())
+
+    def test_stream_meshed_without_seeking(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"))
+        model.obj
+        output = UnseekableStream()
+        model.stream_stl(output)
+        self.assertEqual(self.ref_stl(), b"".join(output.chunks))
+
+    def test_batches(self):
+        faces = [[(i, 0, 0), (i, 1, 0), (i, 1, 1), (i, 0, 1)] for i in range(1500)]
+        output = BytesIO()
+        writer = Binary_STL_Writer(output)
+        writer.add_faces(faces)
+        writer.close()
+        stl = output.getvalue()
+        self.assertEqual(len(stl), 84 + 3000 * 50)
+        self.assertEqual(stl_triangles(stl), 3000)
+        self.assertEqual(struct.unpack("<3f", stl[84 + 2999 * 50 + 12:84 + 2999 * 50 + 24]), (1499.0, 1.0, 1.0))
+
+
+class GreedyTestCase(unittest.TestCase):
+
+    def test_flat_wall(self):
+        as_list = [[x, 0, z, 1, 0] for x in range(10) for z in range(10)]
+        model = BlockModel.from_sparse_json(json.dumps(as_list), greedy=True)
+        self.assertEqual(stl_triangles(model.stl), 12)
+        self.assertEqual(model.content_width, 20.0)
+        self.assertEqual(model.content_height, 20.0)
+
+    def test_textures_kept_apart(self):
+        # grass has a different top to dirt so only the sides can merge fully
+        as_list = [[x, 0, 0, 2 if x < 5 else 3, 0] for x in range(10)]
+        as_json = json.dumps(as_list)
+        by_texture = BlockModel.from_sparse_json(as_json, greedy="texture")
+        any_texture = BlockModel.from_sparse_json(as_json, greedy="all")
+        self.assertEqual(stl_triangles(any_texture.stl), 12)
+        self.assertTrue(stl_triangles(by_texture.stl) > stl_triangles(any_texture.stl))
+
+    def test_partial_blocks_unmerged(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"))
+        greedy_model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"), greedy=True)
+        self.assertTrue(stl_triangles(greedy_model.stl) < stl_triangles(model.stl))
+        self.assertEqual(model.volume, greedy_model.volume)
+        self.assertEqual(model.content_width, greedy_model.content_width)
+        self.assertEqual(model.content_height, greedy_model.content_height)
+
+    def test_texture_stretched(self):
+        # a merged floor has the texture coordinates of a single block's top
+        as_list = [[x, 0, 0, 1, 0] for x in range(10)]
+        model = BlockModel.from_sparse_json(json.dumps(as_list), greedy=True)
+        single = BlockModel.from_sparse_json(json.dumps(as_list[:1]))
+        model.obj
+        single.obj
+        top = list(model.face_sides).index(SIDE_TOP)
+        single_top = list(single.face_sides).index(SIDE_TOP)
+        self.assertEqual(model.face_uvs[top * 4:top * 4 + 4], single.face_uvs[single_top * 4:single_top * 4 + 4])
+        xs = [model.vertex_coords[i * 3] for i in model.face_vertices[top * 4:top * 4 + 4]]
+        self.assertEqual(max(xs) - min(xs), 20)
+
+    def test_t_junctions(self):
+        # an L of three tops merges into a 2x1 and a 1x1, whose corner lies
+        # part way along the bigger face's edge
+        faces = []
+
+        class Recorder(object):
+            def _add_textured_face(self, corners, tex_x, tex_y, side, block_id=0):
+                faces.append(corners)
+
+        merger = GreedyMerger()
+        for x, z in ((0, 0), (1, 0), (0, 1)):
+            merger.add(x, 0, z, SIDE_TOP, 1, 0)
+        merger.add_to(Recorder())
+        self.assertEqual(len(faces), 2)
+        big, small = sorted(faces, key=lambda corners: -max(c[0] for c in corners))
+        self.assertIn((1, 1, 1), small)
+        self.assertNotIn((1, 1, 1), big)
+        self.assertIn((0, 1, 1), big)
+        self.assertIn((2, 1, 1), big)
+
+    @unittest.skipIf(vectorized.np is None, "numpy is not installed")
+    def test_vectorized(self):
+        path = data_path("ref/cup2.schematic")
+        model = BlockModel.from_schematic_file(path, greedy=True)
+        vectorized_model = BlockModel.from_schematic_file(path, mode="vectorized", greedy=True)
+        self.assertEqual(model.obj, vectorized_model.obj)
+        self.assertEqual(model.stl, vectorized_model.stl)
+
+
+class ParallelTestCase(unittest.TestCase):
+
+    def assertModelsMatch(self, model, parallel_model):
+        self.assertEqual(model.stl, parallel_model.stl)
+        self.assertEqual(model.obj, parallel_model.obj)
+        self.assertEqual(model.volume, parallel_model.volume)
+
+    def mixed_json(self):
+        # stairs and slabs scattered across several slabs
+        kinds = [(1, 0), (3, 0), (44, 0), (44, 8), (53, 0), (53, 3), (67, 5), (108, 6)]
+        as_list = [[x, y, z] + list(kinds[(x * 7 + y * 3 + z * 5) % len(kinds)])
+                   for x in range(30) for y in range(3) for z in range(4) if (x + y + z) % 3]
+        return json.dumps(as_list)
+
+    def test_schematic(self):
+        path = data_path("ref/cup2.schematic")
+        self.assertModelsMatch(BlockModel.from_schematic_file(path),
+                               BlockModel.from_schematic_file(path, workers=2))
+
+    def test_mixed_blocks(self):
+        as_json = self.mixed_json()
+        self.assertModelsMatch(BlockModel.from_sparse_json(as_json),
+                               BlockModel.from_sparse_json(as_json, workers=2))
+
+    def test_greedy(self):
+        as_json = self.mixed_json()
+        self.assertModelsMatch(BlockModel.from_sparse_json(as_json, greedy="all"),
+                               BlockModel.from_sparse_json(as_json, greedy="all", workers=2))
+
+    @unittest.skipIf(vectorized.np is None, "numpy is not installed")
+    def test_vectorized(self):
+        as_json = self.mixed_json()
+        self.assertModelsMatch(BlockModel.from_sparse_json(as_json),
+                               BlockModel.from_sparse_json(as_json, mode="vectorized", workers=2))
+
+    def test_stream_stl(self):
+        as_json = self.mixed_json()
+        output = BytesIO()
+        BlockModel.from_sparse_json(as_json, workers=2).stream_stl(output)
+        self.assertEqual(output.getvalue(), BlockModel.from_sparse_json(as_json).stl)
+
+    def test_bad_workers(self):
+        self.assertRaises(Exception, BlockModel.from_sparse_json, self.mixed_json(), workers=0)
+
+
+@unittest.skipIf(vectorized.np is None, "numpy is not installed")
+class HalfGridTestCase(unittest.TestCase):
+
+    def mixed_json(self):
+        kinds = [(1, 0), (3, 0), (44, 0), (44, 8), (53, 0), (53, 3), (67, 5), (108, 6), (2, 0)]
+        as_list = [[x, y, z] + list(kinds[(x * 7 + y * 3 + z * 5) % len(kinds)])
+                   for x in range(20) for y in range(3) for z in range(4) if (x + y + z) % 3]
+        return json.dumps(as_list)
+
+    def assertSameSurface(self, model, half_model):
+        self.assertAlmostEqual(stl_area(model.stl), stl_area(half_model.stl), places=3)
+        self.assertEqual(model.volume, half_model.volume)
+        self.assertEqual(model.content_width, half_model.content_width)
+        self.assertEqual(model.content_height, half_model.content_height)
+        self.assertEqual(model.content_depth, half_model.content_depth)
+
+    def test_schematic(self):
+        path = data_path("ref/cup2.schematic")
+        self.assertSameSurface(BlockModel.from_schematic_file(path),
+                               BlockModel.from_schematic_file(path, mode="halfgrid"))
+
+    def test_mixed_blocks(self):
+        as_json = self.mixed_json()
+        self.assertSameSurface(BlockModel.from_sparse_json(as_json),
+                               BlockModel.from_sparse_json(as_json, mode="halfgrid"))
+
+    def test_cube_faces(self):
+        # a lone cube is six full faces, as in the other modes
+        model = BlockModel.from_json("[[[[1, 0]]]]")
+        self.assertEqual(model.obj, BlockModel.from_json("[[[[1, 0]]]]", mode="halfgrid").obj)
+
+    def test_workers(self):
+        as_json = self.mixed_json()
+        model = BlockModel.from_sparse_json(as_json, mode="halfgrid")
+        parallel_model = BlockModel.from_sparse_json(as_json, mode="halfgrid", workers=2)
+        self.assertEqual(model.obj, parallel_model.obj)
+        self.assertEqual(model.stl, parallel_model.stl)
+
+    def test_greedy(self):
+        # slabs and stairs merge too
+        as_list = [[x, 0, z, 44, 0] for x in range(6) for z in range(6)]
+        as_json = json.dumps(as_list)
+        model = BlockModel.from_sparse_json(as_json, mode="halfgrid")
+        greedy_model = BlockModel.from_sparse_json(as_json, mode="halfgrid", greedy=True)
+        self.assertEqual(stl_triangles(greedy_model.stl), 12)
+        self.assertAlmostEqual(stl_area(model.stl), stl_area(greedy_model.stl), places=3)
+        self.assertEqual(greedy_model.content_depth, 1.0)
+
+
+class StatsTestCase(unittest.TestCase):
+
+    def test_stages_and_counters(self):
+        stages = []
+        stats = Stats(lambda stage, seconds, stats: stages.append(stage))
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"), stats=stats)
+        obj = model.obj
+        model.stl
+        model.obj
+        self.assertEqual(stages, ["read", "process", "obj", "stl"])
+        result = stats.as_dict()
+        self.assertEqual(sorted(result["times"]), ["obj", "process", "read", "stl"])
+        counters = result["counters"]
+        self.assertEqual(counters["voxels_visited"], model.width * model.height * model.depth)
+        self.assertTrue(counters["reader_gets"] >= counters["voxels_visited"])
+        self.assertEqual(counters["faces"], model.face_count)
+        self.assertEqual(counters["vertices"] + counters["vertices_deduplicated"], model.face_count * 4)
+        self.assertEqual(counters["bytes_obj"], len(obj))
+        # the model's reader is left as it was
+        self.assertEqual(type(model.reader).__name__, "SchematicModelReader")
+
+    def test_stream_stl(self):
+        stats = Stats()
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"), stats=stats)
+        output = BytesIO()
+        model.stream_stl(output)
+        self.assertEqual(stats.counters["faces"], stl_triangles(output.getvalue()) // 2)
+        self.assertIn("stream_stl", stats.times)
+
+    def test_stl_meshes_once(self):
+        stats = Stats()
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"), stats=stats)
+        model.stl
+        model.content_width
+        model.obj
+        self.assertEqual(stats.counters["voxels_visited"], model.width * model.height * model.depth)
+        self.assertEqual(stats.counters["faces"], model.face_count)
+
+    def test_sparse_visits_blocks_only(self):
+        stats = Stats()
+        as_list = [[0, 0, 0, 1, 0], [20, 20, 20, 1, 0]]
+        BlockModel.from_sparse_json(json.dumps(as_list), stats=stats).obj
+        self.assertEqual(stats.counters["voxels_visited"], 2)
+
+    def test_sparse_csv_reads_blocks_only(self):
+        as_list = [[0, 0, 0, 1, 0], [20, 20, 20, 44, 8], [0, 5, 0, 3, 0]]
+        model = BlockModel.from_sparse_json(json.dumps(as_list))
+        gets = CountingReader(model.reader)
+        model.reader = gets
+        lines = model.csv.split("\n")
+        self.assertEqual(gets.gets, 3)
+        # a column's blocks top down, then a comma for each x
+        self.assertEqual(lines[0], "3:01:0" + "," * 22)
+        self.assertEqual(lines[20], "," * 20 + "44:8" + "," * 2)
+
+
 class BlockModelFilesTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -0,0 +1,110 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from blockmodel import BlockModel
+from blockmodel.cache import ConversionCache
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def data_path(pth):
+    return os.path.join(DATA_DIR, pth)
+
+
+def sparse_json(block_id=2):
+    return json.dumps([[7, 4, 2, block_id, 0],
+                       [8, 4, 2, block_id, 0],
+                       [9, 6, 3, 53, 3]])
+
+
+class ConversionCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_hit(self):
+        cache = ConversionCache(self.directory)
+        stl = cache.convert(sparse_json(), "sparse_json", "stl")
+        self.assertEqual(stl, BlockModel.from_sparse_json(sparse_json()).stl)
+        self.assertEqual(cache.convert(sparse_json(), "sparse_json", "stl"), stl)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # text comes back as text
+        obj = cache.convert(sparse_json(), "sparse_json", "obj")
+        self.assertEqual(cache.convert(sparse_json(), "sparse_json", "obj"), obj)
+        self.assertEqual(obj, BlockModel.from_sparse_json(sparse_json()).obj)
+
+    def test_schematic_file(self):
+        cache = ConversionCache(self.directory)
+        path = data_path("ref/cup2.schematic")
+        stl = cache.convert(path, "schematic", "stl")
+        with open(data_path("ref/cup2.stl"), "rb") as f:
+            self.assertEqual(stl, f.read())
+        cache.convert(path, "schematic", "stl", workers=None)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.convert(path, "schematic", "obj", mapped=True),
+                         BlockModel.from_schematic_file(path).obj)
+
+    def test_keys(self):
+        cache = ConversionCache(self.directory)
+        key = cache.get_key(sparse_json(), "sparse_json", "stl")
+        self.assertEqual(key, cache.get_key(sparse_json(), "sparse_json", "stl", mode="default"))
+        others = [cache.get_key(sparse_json(3), "sparse_json", "stl"),
+                  cache.get_key(sparse_json(), "json", "stl"),
+                  cache.get_key(sparse_json(), "sparse_json", "obj"),
+                  cache.get_key(sparse_json(), "sparse_json", "stl", max_size=[10, 10, 10]),
+                  cache.get_key(sparse_json(), "sparse_json", "stl", scale=1),
+                  cache.get_key(sparse_json(), "sparse_json", "stl", mode="halfgrid"),
+                  cache.get_key(sparse_json(), "sparse_json", "stl", greedy="all")]
+        self.assertEqual(len(set(others + [key])), len(others) + 1)
+
+    def test_scale(self):
+        cache = ConversionCache(self.directory)
+        model = BlockModel.from_sparse_json(sparse_json())
+        model.scale = 1
+        model.stl_scale = 1.0
+        self.assertEqual(cache.convert(sparse_json(), "sparse_json", "obj", scale=1), model.obj)
+        self.assertNotEqual(cache.convert(sparse_json(), "sparse_json", "obj"), model.obj)
+
+    def test_eviction(self):
+        size = len(BlockModel.from_sparse_json(sparse_json()).stl)
+        cache = ConversionCache(self.directory, max_bytes=size * 2)
+        cache.convert(sparse_json(1), "sparse_json", "stl")
+        cache.convert(sparse_json(2), "sparse_json", "stl")
+        # using the first makes the second the least recently used
+        cache.convert(sparse_json(1), "sparse_json", "stl")
+        cache.convert(sparse_json(3), "sparse_json", "stl")
+        self.assertEqual(cache.size, size * 2)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        cache.convert(sparse_json(1), "sparse_json", "stl")
+        self.assertEqual(cache.hits, 2)
+        cache.convert(sparse_json(2), "sparse_json", "stl")
+        self.assertEqual(cache.misses, 4)
+
+    def test_reopen(self):
+        with open(os.path.join(self.directory, "notes.txt"), "w") as f:
+            f.write("not a cache entry")
+        ConversionCache(self.directory).convert(sparse_json(), "sparse_json", "stl")
+        cache = ConversionCache(self.directory, max_bytes=1)
+        self.assertEqual(len(cache.entries), 1)
+        cache.clear()
+        self.assertEqual(os.listdir(self.directory), ["notes.txt"])
+        self.assertEqual(cache.size, 0)
+
+    def test_bad_arguments(self):
+        cache = ConversionCache(self.directory)
+        self.assertRaises(Exception, cache.convert, sparse_json(), "sparse", "stl")
+        self.assertRaises(Exception, cache.convert, sparse_json(), "sparse_json", "stl_faces")
+        self.assertRaises(Exception, cache.convert, sparse_json(), "sparse_json", "stl", block_mapper=None)
+        # only schematics can be memory mapped
+        self.assertRaises(Exception, cache.convert, sparse_json(), "sparse_json", "stl", mapped=True)
+        self.assertRaises(Exception, ConversionCache, os.path.join(self.directory, "missing"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+
+from blockmodel.constants import *
+from blockmodel import BlockModel
+from blockmodel.mapper import MinecraftBlockMapper, quadrant_bit, HALFSLAB_LOWER
+
+
+class Accessor(object):
+
+    def __init__(self, block_id, block_data):
+        self.block = (block_id, block_data)
+
+    def get(self, x, y, z):
+        return self.block
+
+
+class MapperTableTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.mapper = MinecraftBlockMapper()
+
+    def find(self, block_id, block_data):
+        # the dictionary lookup the table replaces
+        block = self.mapper.lu.get(block_id)
+        if not block:
+            block = self.mapper.lu.get((block_id, block_data))
+        return block
+
+    def test_table_matches_lookup(self):
+        for block_id in list(range(260)) + [4095, 4096, 5000, -1]:
+            for block_data in list(range(16)) + [16, 200, -1]:
+                expected = self.find(block_id, block_data)
+                self.assertIs(self.mapper.get_block(0, 0, 0, Accessor(block_id, block_data)), expected)
+                self.assertEqual(self.mapper.can_render(block_id, block_data), expected is not None)
+
+    def test_types_and_uvs(self):
+        for slot in range(256 * 16):
+            block = self.mapper.blocks[self.mapper.block_index[slot]]
+            if block is None:
+                self.assertEqual(self.mapper.block_types[slot], TYPE_NONE)
+                continue
+            self.assertEqual(self.mapper.block_types[slot], TYPE_CODES[block.block_type])
+            uvs = tuple(self.mapper.block_uvs[slot * 6:slot * 6 + 6])
+            self.assertEqual(uvs, self.mapper.get_tex_uv(block, SIDE_TOP) +
+                                  self.mapper.get_tex_uv(block, SIDE_FRONT) +
+                                  self.mapper.get_tex_uv(block, SIDE_BOTTOM))
+
+    def test_tex_uv(self):
+        grass = self.find(2, 0)
+        self.assertEqual(self.mapper.get_tex_uv(grass, SIDE_TOP), grass.top_uv)
+        self.assertEqual(self.mapper.get_tex_uv(grass, SIDE_LEFT), grass.uv)
+
+    def test_tiles(self):
+        grass = self.find(2, 0)
+        self.assertEqual(self.mapper.get_tile_name(*grass.top_uv), "grass_top")
+        self.assertEqual(self.mapper.get_tile_name(*grass.bottom_uv), "dirt")
+        # grass is green, dirt brown and stone grey
+        red, green, blue = self.mapper.get_tile_colour(*grass.top_uv)
+        self.assertTrue(green > red and green > blue)
+        red, green, blue = self.mapper.get_tile_colour(*grass.bottom_uv)
+        self.assertTrue(red > green > blue)
+        red, green, blue = self.mapper.get_tile_colour(*self.find(1, 0).uv)
+        self.assertTrue(red == green == blue)
+
+
+class Blocks(object):
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+
+    def get(self, x, y, z):
+        return self.blocks.get((x, y, z), (0, 0))
+
+
+class QuadrantsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.mapper = MinecraftBlockMapper()
+
+    def test_single_blocks(self):
+        self.assertEqual(self.mapper.get_quadrants(0, 0, 0, Accessor(1, 0)), 0xFF)
+        self.assertEqual(self.mapper.get_quadrants(0, 0, 0, Accessor(44, 0)), HALFSLAB_LOWER)
+        self.assertEqual(self.mapper.get_quadrants(0, 0, 0, Accessor(44, 8)), 0xFF ^ HALFSLAB_LOWER)
+        self.assertEqual(self.mapper.get_quadrants(0, 0, 0, Blocks({})), 0)
+        # an east facing stair is missing its top west quarter
+        east = Blocks({(0, 0, 0): (53, 0)})
+        self.assertEqual(self.mapper.get_quadrants(0, 0, 0, east), 0xFF ^ quadrant_bit(0, 1, 0) ^ quadrant_bit(0, 1, 1))
+
+    def test_stairs_match_is_blank(self):
+        # every stair with every stair or none behind and in front of it
+        for data in range(8):
+            for behind in [None] + list(range(8)):
+                for front in [None] + list(range(8)):
+                    step = self.mapper.get_missing_blocks(data)[2]
+                    blocks = {(1, 0, 1): (53, data)}
+                    if behind is not None:
+                        blocks[(1 - step[0], 0, 1 - step[1])] = (67, behind)
+                    if front is not None:
+                        blocks[(1 + step[0], 0, 1 + step[1])] = (108, front)
+                    accessor = Blocks(blocks)
+                    quadrants = self.mapper.get_quadrants(1, 0, 1, accessor)
+                    for xx in (0, 1):
+                        for yy in (0, 1):
+                            for zz in (0, 1):
+                                blank = self.mapper.is_blank(1, 0, 1, xx / 2.0, yy / 2.0, zz / 2.0, accessor)
+                                self.assertEqual(blank, not quadrants & quadrant_bit(xx, yy, zz))
+
+
+class SharedMapperTestCase(unittest.TestCase):
+
+    def test_models_share_a_mapper(self):
+        as_json = "[[[[1, 0]]]]"
+        first = BlockModel.from_json(as_json)
+        second = BlockModel.from_json(as_json)
+        self.assertIs(first.block_mapper, second.block_mapper)
+        self.assertIs(first.block_mapper, MinecraftBlockMapper.get_shared())
+
+    def test_custom_mapper(self):
+        mapper = MinecraftBlockMapper()
+        # stone is drawn with the dirt texture by this mapper
+        mapper.lu[1] = mapper.lu[3]
+        mapper._make_table()
+        model = BlockModel.from_json("[[[[1, 0]]]]", block_mapper=mapper)
+        self.assertIs(model.block_mapper, mapper)
+        self.assertNotEqual(model.obj, BlockModel.from_json("[[[[1, 0]]]]").obj)
+        self.assertEqual(model.obj, BlockModel.from_json("[[[[3, 0]]]]").obj)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+import os
+import json
+import tempfile
+import unittest
+from io import BytesIO
+from nbt import nbt
+
+from blockmodel import BlockModel
+from blockmodel.readers import *
+from blockmodel.readers.base import BaseModelReader
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def data_path(pth):
+    return os.path.join(DATA_DIR, pth)
+
+
+def sparse_json():
+    return json.dumps([[7, 4, 2, 2, 0],
+                       [8, 4, 2, 2, 0],
+                       [9, 4, 2, 2, 0],
+                       [9, 6, 3, 53, 3]])
+
+
+class RegionTestCase(unittest.TestCase):
+
+    def assertRegionsMatch(self, reader):
+        boxes = [(0, 0, 0, reader.width, reader.height, reader.depth),
+                 (-2, -1, -3, reader.width + 4, reader.height + 2, reader.depth + 5),
+                 (1, 0, 2, 3, 1, 2),
+                 (reader.width, 0, 0, 2, 2, 2)]
+        for box in boxes:
+            # the base class builds regions from get so use it as the reference
+            self.assertEqual(reader.get_region(*box), BaseModelReader.get_region(reader, *box))
+
+    def test_schematic(self):
+        self.assertRegionsMatch(SchematicModelReader(data_path("ref/cup2.schematic"), None))
+
+    def test_json(self):
+        with open(data_path("ref/073985f1c3e2f26c5be4a01073de42d3"), "r") as f:
+            self.assertRegionsMatch(JsonModelReader(f.read(), None))
+
+    def test_png(self):
+        with open(data_path("ref/block.png"), "rb") as f:
+            self.assertRegionsMatch(PngModelReader(f.read(), None))
+
+    def test_sparse_json(self):
+        self.assertRegionsMatch(SparseJsonModelReader(sparse_json(), None))
+
+    def test_region(self):
+        schematic = SchematicModelReader(data_path("ref/cup2.schematic"), None)
+        origin = (-1, 1, 2)
+        size = (schematic.width, schematic.height - 1, 3)
+        blocks, data = schematic.get_region(*(origin + size))
+        reader = RegionModelReader(blocks, data, origin, size, (schematic.width, schematic.height, schematic.depth))
+        self.assertEqual(reader.get(3, 2, 3), schematic.get(3, 2, 3))
+        self.assertEqual(reader.get(3, 0, 3), (0, 0))
+        self.assertRegionsMatch(reader)
+
+    def test_occupied(self):
+        reader = SparseJsonModelReader(sparse_json(), None)
+        self.assertEqual(list(reader.occupied()), [(0, 0, 0), (1, 0, 0), (2, 0, 0), (2, 2, 1)])
+        self.assertEqual(list(reader.occupied(1, 2)), [(1, 0, 0)])
+        # by default every cell is visited
+        schematic = SchematicModelReader(data_path("ref/cup2.schematic"), None)
+        cells = list(BaseModelReader.occupied(schematic))
+        self.assertEqual(len(cells), schematic.width * schematic.height * schematic.depth)
+        self.assertEqual(cells, sorted(cells))
+
+    def test_to_arrays(self):
+        reader = SparseJsonModelReader(sparse_json(), None)
+        blocks, data = reader.to_arrays()
+        self.assertEqual(blocks.typecode, "H")
+        self.assertEqual(data.typecode, "B")
+        self.assertEqual(len(blocks), reader.width * reader.height * reader.depth)
+        # YZX order
+        i = (2 * reader.depth + 1) * reader.width + 2
+        self.assertEqual((blocks[i], data[i]), (53, 3))
+        self.assertEqual((blocks[i], data[i]), reader.get(2, 2, 1))
+
+    def test_out_of_range(self):
+        # ids and data past what a region holds are refused up front
+        for block in ([70000, 0], [1, 300], [-1, 0], [1, -2]):
+            self.assertRaises(ValueError, JsonModelReader, json.dumps([[[block]]]), None)
+            self.assertRaises(ValueError, SparseJsonModelReader, json.dumps([[0, 0, 0] + block]), None)
+        reader = JsonModelReader(json.dumps([[[[65535, 255]]]]), None)
+        self.assertEqual(reader.to_arrays(), BaseModelReader.get_region(reader, 0, 0, 0, 1, 1, 1))
+
+
+class SchematicViewsTestCase(unittest.TestCase):
+
+    def test_views_share_storage(self):
+        reader = SchematicModelReader(data_path("ref/cup2.schematic"), None)
+        blocks, data = reader.views()
+        self.assertIs(blocks.obj, reader.blocks.value)
+        self.assertIs(data.obj, reader.data.value)
+        self.assertEqual(list(blocks), list(reader.to_arrays()[0]))
+
+    def test_other_readers_have_no_views(self):
+        self.assertIsNone(SparseJsonModelReader(sparse_json(), None).views())
+
+    def test_round_trip(self):
+        model = BlockModel.from_schematic_file(data_path("ref/cup2.schematic"))
+        nbtfile = nbt.NBTFile(fileobj=BytesIO(model.schematic))
+        self.assertEqual(nbtfile["Blocks"].value, model.reader.blocks.value)
+        self.assertEqual(nbtfile["Data"].value, model.reader.data.value)
+
+
+class MappedSchematicTestCase(unittest.TestCase):
+
+    def test_matches_schematic_reader(self):
+        path = data_path("ref/cup2.schematic")
+        reader = SchematicModelReader(path, None)
+        mapped = MappedSchematicModelReader(path, None)
+        self.assertEqual((reader.width, reader.height, reader.depth), (mapped.width, mapped.height, mapped.depth))
+        self.assertEqual(reader.to_arrays(), mapped.to_arrays())
+        self.assertEqual(reader.get(2, 1, 3), mapped.get(2, 1, 3))
+        mapped.close()
+
+    def test_uncompressed(self):
+        # this schematic was saved without gzip
+        path = data_path("ref/printcraft_0ed4ab4cab8142e3ef3b4371e04da809414735d0ab6f989eee89d360cb45309b.schematic")
+        mapped = MappedSchematicModelReader(path, None)
+        self.assertEqual((mapped.width, mapped.height, mapped.depth), (1, 2, 6))
+        mapped.close()
+
+    def write_schematic(self, blocks_length, data_length):
+        nbtfile = nbt.NBTFile()
+        nbtfile.name = "Schematic"
+        for name, value in (("Width", 2), ("Height", 1), ("Length", 3)):
+            nbtfile.tags.append(nbt.TAG_Short(name=name, value=value))
+        for name, length in (("Blocks", blocks_length), ("Data", data_length)):
+            array = nbt.TAG_Byte_Array(name=name)
+            array.value = bytearray(length)
+            nbtfile.tags.append(array)
+        handle, path = tempfile.mkstemp(suffix=".schematic")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        nbtfile.write_file(path)
+        return path
+
+    def test_array_lengths(self):
+        mapped = MappedSchematicModelReader(self.write_schematic(6, 6), None)
+        self.assertEqual(len(mapped.to_arrays()[0]), 6)
+        mapped.close()
+        # short and long arrays don't match the size
+        for lengths in ((5, 6), (6, 7), (0, 0)):
+            self.assertRaises(ValueError, MappedSchematicModelReader, self.write_schematic(*lengths), None)
+
+    def test_too_big(self):
+        self.assertRaises(Exception, MappedSchematicModelReader, data_path("ref/test.schematic"), 30)
+
+    def test_model(self):
+        path = data_path("ref/cup2.schematic")
+        model = BlockModel.from_schematic_file(path, mapped=True)
+        with open(data_path("ref/cup2.stl"), "rb") as f:
+            self.assertEqual(f.read(), model.stl)
+        self.assertEqual(BlockModel.from_schematic_file(path).schematic, model.schematic)
+        model.reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
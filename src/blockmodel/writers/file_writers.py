@@ -14,6 +14,41 @@ def write_stl(file_path, stl_binary_data):
         f.write(stl_binary_data)
 
 
+def write_stl_stream(file_path, stream_stl):
+
+    file_path = _check_file_path(file_path, "stl")
+
+    with open(file_path, "wb") as f:
+        stream_stl(f)
+
+
+def write_glb(file_path, glb_binary_data):
+
+    file_path = _check_file_path(file_path, "glb")
+
+    with open(file_path, "wb") as f:
+        f.write(glb_binary_data)
+
+
+def write_ply(file_path, ply_binary_data):
+
+    dir_path, file_path = _check_file_path(file_path, "ply", in_folder=True)
+
+    with open(file_path, "wb") as f:
+        f.write(ply_binary_data)
+
+    #add the texture
+    shutil.copy(os.path.join(RESOURCE_DIR, "terrain_big.png"), dir_path)
+
+
+def write_3mf_stream(file_path, stream_3mf):
+
+    file_path = _check_file_path(file_path, "3mf")
+
+    with open(file_path, "wb") as f:
+        stream_3mf(f)
+
+
 def write_csv(file_path, csv_string):
 
     file_path = _check_file_path(file_path, "csv")
@@ -34,6 +69,17 @@ def write_x3d(file_path, x3d_string):
 
 
 
+def write_x3d_stream(file_path, stream_x3d):
+
+    dir_path, file_path = _check_file_path(file_path, "x3d", in_folder=True)
+
+    with open(file_path, "w") as f:
+        stream_x3d(f)
+
+    #add the texture
+    shutil.copy(os.path.join(RESOURCE_DIR, "terrain_big.png"), dir_path)
+
+
 def write_collada(file_path, collada_string):
 
     dir_path, file_path = _check_file_path(file_path, "dae", in_folder=True)
@@ -45,6 +91,17 @@ def write_collada(file_path, collada_string):
     shutil.copy(os.path.join(RESOURCE_DIR, "terrain.png"), dir_path)
 
 
+def write_collada_stream(file_path, stream_collada):
+
+    dir_path, file_path = _check_file_path(file_path, "dae", in_folder=True)
+
+    with open(file_path, "w") as f:
+        stream_collada(f)
+
+    #add the texture
+    shutil.copy(os.path.join(RESOURCE_DIR, "terrain.png"), dir_path)
+
+
 def write_obj(file_path, obj_string):
 
     dir_path, file_path = _check_file_path(file_path, "obj", in_folder=True)
@@ -57,6 +114,18 @@ def write_obj(file_path, obj_string):
     shutil.copy(os.path.join(RESOURCE_DIR, "printcraft.mtl"), dir_path)
 
 
+def write_obj_stream(file_path, stream_obj):
+
+    dir_path, file_path = _check_file_path(file_path, "obj", in_folder=True)
+
+    with open(file_path, "w") as f:
+        stream_obj(f)
+
+    #add the texture
+    shutil.copy(os.path.join(RESOURCE_DIR, "terrain_big.png"), dir_path)
+    shutil.copy(os.path.join(RESOURCE_DIR, "printcraft.mtl"), dir_path)
+
+
 def _check_file_path(file_path, ext, in_folder=False):
 
     dir, file_name = os.path.split(file_path)
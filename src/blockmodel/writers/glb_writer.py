@@ -0,0 +1,107 @@
+import json
+import struct
+import sys
+
+GLB_MAGIC = b"glTF"
+GLB_VERSION = 2
+GLB_HEADER = struct.Struct("<4sII")
+GLB_CHUNK_HEADER = struct.Struct("<I4s")
+
+# glTF constants
+FLOAT = 5126
+UNSIGNED_INT = 5125
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+NEAREST = 9728
+CLAMP_TO_EDGE = 33071
+
+
+def to_little_endian(values):
+    if sys.byteorder == "big":
+        values = values[:]
+        values.byteswap()
+    return values.tobytes() if hasattr(values, "tobytes") else values.tostring()
+
+
+def _pad(data, fill):
+    return data + fill * (-len(data) % 4)
+
+
+def _bounds(values, size):
+    return ([min(values[i::size]) for i in range(size)],
+            [max(values[i::size]) for i in range(size)])
+
+
+def make_glb(positions, normals, uvs, indices, png, name="printcraft-model"):
+    """
+    Returns a binary glTF file with one textured triangle mesh.
+
+    positions and normals are flat array("f")s of x, y, z per vertex, uvs one
+    of u, v per vertex with v running down the image as glTF has it, and
+    indices an array("I") of three vertices per triangle. png is the texture,
+    stored in the file's buffer after the mesh.
+    """
+    gltf = {
+        "asset": {"version": "2.0", "generator": "Printcraft, http://www.printcraft.org"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"name": name}],
+    }
+    chunks = []
+    views = []
+    accessors = []
+
+    def add_view(data, target=None):
+        view = {"buffer": 0, "byteOffset": sum(len(c) for c in chunks), "byteLength": len(data)}
+        if target is not None:
+            view["target"] = target
+        chunks.append(_pad(data, b"\x00"))
+        views.append(view)
+        return len(views) - 1
+
+    def add_accessor(values, size, kind, target, bounds=False):
+        accessor = {"bufferView": add_view(to_little_endian(values), target), "componentType": kind,
+                    "count": len(values) // size, "type": "SCALAR" if size == 1 else "VEC%i" % size}
+        if bounds:
+            accessor["min"], accessor["max"] = _bounds(values, size)
+        accessors.append(accessor)
+        return len(accessors) - 1
+
+    if len(indices):
+        primitive = {
+            "attributes": {
+                "POSITION": add_accessor(positions, 3, FLOAT, ARRAY_BUFFER, bounds=True),
+                "NORMAL": add_accessor(normals, 3, FLOAT, ARRAY_BUFFER),
+                "TEXCOORD_0": add_accessor(uvs, 2, FLOAT, ARRAY_BUFFER),
+            },
+            "indices": add_accessor(indices, 1, UNSIGNED_INT, ELEMENT_ARRAY_BUFFER),
+            "material": 0,
+        }
+        gltf["nodes"][0]["mesh"] = 0
+        gltf["meshes"] = [{"name": name, "primitives": [primitive]}]
+        # the blocks are lit evenly as in the collada output, with the
+        # texture's transparent pixels cut out
+        gltf["materials"] = [{
+            "name": "minecraftblocks",
+            "pbrMetallicRoughness": {"baseColorTexture": {"index": 0}, "metallicFactor": 0.0, "roughnessFactor": 1.0},
+            "alphaMode": "MASK",
+            "doubleSided": True,
+            "extensions": {"KHR_materials_unlit": {}},
+        }]
+        gltf["extensionsUsed"] = ["KHR_materials_unlit"]
+        gltf["textures"] = [{"source": 0, "sampler": 0}]
+        gltf["samplers"] = [{"magFilter": NEAREST, "minFilter": NEAREST, "wrapS": CLAMP_TO_EDGE, "wrapT": CLAMP_TO_EDGE}]
+        gltf["images"] = [{"bufferView": add_view(png), "mimeType": "image/png"}]
+
+    binary = b"".join(chunks)
+    if binary:
+        gltf["bufferViews"] = views
+        gltf["accessors"] = accessors
+        gltf["buffers"] = [{"byteLength": len(binary)}]
+    header = _pad(json.dumps(gltf, sort_keys=True, separators=(",", ":")).encode("utf-8"), b" ")
+
+    parts = [GLB_CHUNK_HEADER.pack(len(header), b"JSON"), header]
+    if binary:
+        parts.extend((GLB_CHUNK_HEADER.pack(len(binary), b"BIN\x00"), binary))
+    body = b"".join(parts)
+    return GLB_HEADER.pack(GLB_MAGIC, GLB_VERSION, GLB_HEADER.size + len(body)) + body
@@ -0,0 +1,50 @@
+import struct
+from itertools import chain, repeat
+
+from .glb_writer import to_little_endian
+
+# faces packed with one struct call
+BATCH_SIZE = 1024
+
+PLY_HEADER = """ply
+format binary_little_endian 1.0
+comment A printcraft model
+comment TextureFile terrain_big.png
+element vertex %i
+property float x
+property float y
+property float z
+property float s
+property float t
+element face %i
+property list uchar int vertex_indices
+%send_header
+"""
+
+BLOCK_ID_PROPERTY = "property ushort block_id\n"
+
+
+def make_ply(vertices, corners, block_ids=None):
+    """
+    Returns a binary little endian PLY file of quads.
+
+    vertices is a flat array("f") of x, y, z, s, t per vertex and corners an
+    array of four vertex indices per face. If block_ids, an array of one per
+    face, is given each face gets a block_id property.
+    """
+    face_count = len(corners) // 4
+    header = PLY_HEADER % (len(vertices) // 5, face_count, BLOCK_ID_PROPERTY if block_ids is not None else "")
+    parts = [header.encode("ascii"), to_little_endian(vertices)]
+
+    record = "B4i" if block_ids is None else "B4iH"
+    columns = [repeat(4, face_count), corners[0::4], corners[1::4], corners[2::4], corners[3::4]]
+    if block_ids is not None:
+        columns.append(block_ids)
+    values = list(chain.from_iterable(zip(*columns)))
+    size = len(columns)
+    batch = struct.Struct("<" + record * BATCH_SIZE)
+    for start in range(0, face_count, BATCH_SIZE):
+        stop = min(start + BATCH_SIZE, face_count)
+        packer = batch if stop - start == BATCH_SIZE else struct.Struct("<" + record * (stop - start))
+        parts.append(packer.pack(*values[start * size:stop * size]))
+    return b"".join(parts)
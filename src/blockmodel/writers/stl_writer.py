@@ -17,9 +17,15 @@ endloop
 endfacet
 """
 
-BINARY_HEADER ="80sI"
+BINARY_HEADER ="<80sI"
 BINARY_FACET = "12fH"
 
+# triangles packed with one struct call
+BATCH_SIZE = 1024
+
+BINARY_HEADER_STRUCT = struct.Struct(BINARY_HEADER)
+BINARY_BATCH_STRUCT = struct.Struct("<" + BINARY_FACET * BATCH_SIZE)
+
 class ASCII_STL_Writer(object):
     """ Export 3D objects build of 3 or 4 vertices as ASCII STL file.
     """
@@ -58,28 +64,53 @@ class ASCII_STL_Writer(object):
 
 class Binary_STL_Writer(ASCII_STL_Writer):
     """ Export 3D objects build of 3 or 4 vertices as binary STL file.
+
+    Triangles are packed and written in batches as they are added. If the
+    number of triangles is given up front the header is written once and
+    the stream never needs to seek, so it can be a socket. Otherwise the
+    count is patched into the header on close.
     """
-    def __init__(self, stream):
+    def __init__(self, stream, triangle_count=None):
         self.counter = 0
+        self.triangle_count = triangle_count
+        self.batch = []
+        # only remember where the header is if it will need patching
+        self.start = stream.tell() if triangle_count is None else None
         super(Binary_STL_Writer, self).__init__(stream)
 
     def close(self):
-        self._write_header()
+        self._flush()
+        if self.counter != self.triangle_count:
+            if self.start is None:
+                raise ValueError("%s triangles written but the header says %s" % (self.counter, self.triangle_count))
+            end = self.fp.tell()
+            self.fp.seek(self.start)
+            self._write_header()
+            self.fp.seek(end)
 
     def _write_header(self):
-        self.fp.seek(0)
-        self.fp.write(struct.pack(BINARY_HEADER, b'Python Binary STL Writer', self.counter))
+        count = self.counter if self.triangle_count is None else self.triangle_count
+        self.fp.write(BINARY_HEADER_STRUCT.pack(b'Python Binary STL Writer', count))
 
     def _write(self, face):
         self.counter += 1
-        data = [
+        self.batch.extend((
             0., 0., 0.,
             face[0][0], face[0][1], face[0][2],
             face[1][0], face[1][1], face[1][2],
             face[2][0], face[2][1], face[2][2],
             0
-        ]
-        self.fp.write(struct.pack(BINARY_FACET, *data))
+        ))
+        if self.counter % BATCH_SIZE == 0:
+            self._flush()
+
+    def _flush(self):
+        count = len(self.batch) // 13
+        if count == BATCH_SIZE:
+            self.fp.write(BINARY_BATCH_STRUCT.pack(*self.batch))
+        elif count:
+            self.fp.write(struct.pack("<" + BINARY_FACET * count, *self.batch))
+        self.batch = []
 
 
 def example():